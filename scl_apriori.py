@@ -0,0 +1,156 @@
+from maltoolbox.attackgraph.analyzers import apriori
+
+#The viability and necessity of these attack steps only depend on their own existence or defense
+#status, those of the 'or' and 'and' steps are propagated from their parents
+SOURCE_TYPES = ('exist', 'notExist', 'defense')
+
+#Viability and necessity (see maltoolbox.attackgraph.analyzers.apriori) are properties of the model,
+#they do not depend on the attackers: compromising attack steps or changing entry points leaves them
+#valid. They change with the existence and defense statuses of the source steps, which
+#set_defense_status and set_existence_status update incrementally for what-if analysis.
+
+#Steps with a TTC distribution do not make their children unnecessary (as in apriori)
+def propagates_necessity(ag_node):
+    return not (ag_node.ttc and 'name' in ag_node.ttc and ag_node.ttc['name'] not in ('Enabled', 'Disabled'))
+
+#Calculate the viability and necessity of every step of the graph, the same results as
+#apriori.calculate_viability_and_necessity without its recursion. The values are propagated from
+#the source steps in layers, each layer holding the steps changed by the previous one, and every
+#step is only re-evaluated when one of its parents changed.
+def calculate_viability_and_necessity(attack_graph):
+    unviable, unnecessary = [], []
+    for ag_node in attack_graph.nodes:
+        if ag_node.type in SOURCE_TYPES:
+            apriori.evaluate_viability_and_necessity(ag_node)
+            if not ag_node.is_viable:
+                unviable.append(ag_node)
+            if not ag_node.is_necessary:
+                unnecessary.append(ag_node)
+        else:
+            ag_node.is_viable = True
+            ag_node.is_necessary = True
+    _propagate_unviable(unviable)
+    _propagate_unnecessary(unnecessary)
+
+#Recalculate the viability and necessity of the given steps and everything reachable from them
+#after the graph around them changed. The rest of the graph keeps its values.
+#Returns the steps whose viability or necessity changed.
+def update_viability_and_necessity(attack_graph, nodes):
+    region = {}
+    stack = list(nodes)
+    while stack:
+        ag_node = stack.pop()
+        if ag_node.id in region or attack_graph.get_node_by_id(ag_node.id) is not ag_node:
+            continue
+        region[ag_node.id] = ag_node
+        stack.extend(ag_node.children)
+    previous = {nodeId: (ag_node.is_viable, ag_node.is_necessary) for nodeId, ag_node in region.items()}
+
+    sources = []
+    for ag_node in region.values():
+        if ag_node.type in SOURCE_TYPES:
+            apriori.evaluate_viability_and_necessity(ag_node)
+            sources.append(ag_node)
+        else:
+            ag_node.is_viable = True
+            ag_node.is_necessary = True
+    #Propagate from the sources of the region and from the parents outside of it
+    sources.extend(parent for ag_node in region.values() for parent in ag_node.parents if parent.id not in region)
+    _propagate_unviable([ag_node for ag_node in sources if not ag_node.is_viable], region)
+    _propagate_unnecessary([ag_node for ag_node in sources if not ag_node.is_necessary], region)
+    return [ag_node for nodeId, ag_node in region.items()
+            if (ag_node.is_viable, ag_node.is_necessary) != previous[nodeId]]
+
+#What-if analysis: change the defense status (0.0 to 1.0) of a defense step and return the steps
+#whose viability or necessity changed
+def set_defense_status(ag_node, defense_status):
+    ag_node.defense_status = defense_status
+    return _update_source(ag_node)
+
+#What-if analysis: change the existence status of an exist or notExist step and return the steps
+#whose viability or necessity changed
+def set_existence_status(ag_node, existence_status):
+    ag_node.existence_status = existence_status
+    return _update_source(ag_node)
+
+#Viability and necessity only decrease when a source does, so a source that becomes unviable
+#(unnecessary) is propagated as in the full calculation. A source that becomes viable (necessary)
+#again can only change the unviable (unnecessary) steps that it reaches through unviable
+#(unnecessary) steps, those are reset and evaluated again from their other parents.
+def _update_source(ag_node):
+    viable, necessary = ag_node.is_viable, ag_node.is_necessary
+    apriori.evaluate_viability_and_necessity(ag_node)
+    changed = {}
+    if viable != ag_node.is_viable:
+        changed[ag_node.id] = ag_node
+        if ag_node.is_viable:
+            restored = _restore(ag_node, 'is_viable', _propagate_unviable)
+        else:
+            restored = _propagate_unviable([ag_node])
+        changed.update((step.id, step) for step in restored)
+    if necessary != ag_node.is_necessary:
+        changed[ag_node.id] = ag_node
+        if ag_node.is_necessary:
+            restored = _restore(ag_node, 'is_necessary', _propagate_unnecessary)
+        else:
+            restored = _propagate_unnecessary([ag_node])
+        changed.update((step.id, step) for step in restored)
+    return list(changed.values())
+
+def _restore(ag_node, attribute, propagate):
+    region = {}
+    stack = list(ag_node.children)
+    while stack:
+        step = stack.pop()
+        if step.id in region or step.type in SOURCE_TYPES or getattr(step, attribute):
+            continue
+        region[step.id] = step
+        stack.extend(step.children)
+    for step in region.values():
+        setattr(step, attribute, True)
+    sources = [parent for step in region.values() for parent in step.parents
+               if parent.id not in region and not getattr(parent, attribute)]
+    stillFalse = {step.id for step in propagate(sources, region)}
+    return [step for step in region.values() if step.id not in stillFalse]
+
+#An 'or' step is unviable when all of its parents are, an 'and' step when one of them is.
+#Propagate from the given unviable steps to the steps of region (all steps if None) and
+#return the steps made unviable.
+def _propagate_unviable(layer, region=None):
+    changed = []
+    while layer:
+        nextLayer = []
+        for ag_node in layer:
+            for child in ag_node.children:
+                if not child.is_viable or child.type in SOURCE_TYPES or (region is not None and child.id not in region):
+                    continue
+                if child.type == 'and' or not any(parent.is_viable for parent in child.parents):
+                    child.is_viable = False
+                    nextLayer.append(child)
+        changed.extend(nextLayer)
+        layer = nextLayer
+    return changed
+
+#An 'or' step is unnecessary when one of its parents is, an 'and' step when all of them are.
+#Only parents without a TTC distribution make their children unnecessary, an 'and' step needs one
+#of those among its unnecessary parents.
+def _propagate_unnecessary(layer, region=None):
+    changed = []
+    while layer:
+        nextLayer = []
+        for ag_node in layer:
+            propagates = propagates_necessity(ag_node)
+            for child in ag_node.children:
+                if not child.is_necessary or child.type in SOURCE_TYPES or (region is not None and child.id not in region):
+                    continue
+                if child.type == 'or':
+                    if not propagates:
+                        continue
+                elif any(parent.is_necessary for parent in child.parents) or not \
+                        any(propagates_necessity(parent) for parent in child.parents if not parent.is_necessary):
+                    continue
+                child.is_necessary = False
+                nextLayer.append(child)
+        changed.extend(nextLayer)
+        layer = nextLayer
+    return changed
@@ -0,0 +1,169 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from scl_cache import DEFAULT_MAX_SIZE, OutputCache, output_files
+from scl_parser_v1 import LANG_CACHE_DIR, PARSER_VERSION, SclParser, load_lang_graph, pipeline_counts, run_pipeline
+from scl_profile import Profiler
+
+logger = logging.getLogger(__name__)
+
+#The parser of a worker process, created on the first cache miss and reused for every file
+_parser = None
+_lang_file = None
+_cache_dir = None
+#The output cache of a worker process, None when the outputs are not cached
+_output_cache = None
+
+def init_worker(lang_file, cache_dir, output_cache_dir=None, output_cache_size=DEFAULT_MAX_SIZE):
+    global _lang_file, _cache_dir, _output_cache
+    _lang_file, _cache_dir = lang_file, cache_dir
+    if output_cache_dir is not None:
+        _output_cache = OutputCache(output_cache_dir, output_cache_size)
+
+def get_parser():
+    global _parser
+    if _parser is None:
+        _parser = SclParser(_lang_file, _cache_dir)
+    return _parser
+
+#Run the pipeline for one SCD file in a worker. Errors are returned in the result instead of
+#raised, so one malformed SCD does not abort the batch.
+def convert_file(scd_file, output_dir, streaming, formats=('yml',)):
+    start = time.perf_counter()
+    result = {'scd_file': scd_file, 'output_dir': output_dir}
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        cacheKey = None
+        counts = None
+        if _output_cache is not None:
+            cacheKey = _output_cache.key(scd_file, _lang_file, PARSER_VERSION)
+            counts = _output_cache.get(cacheKey, output_dir, output_files(formats))
+        result['cached'] = counts is not None
+        if counts is None:
+            profiler = Profiler()
+            instance_model, attack_graph = run_pipeline(get_parser(), scd_file, output_dir, streaming, formats, profiler)
+            counts = pipeline_counts(instance_model, attack_graph)
+            result['profile'] = profiler.to_dict()
+            if _output_cache is not None:
+                _output_cache.put(cacheKey, output_dir, counts, output_files(formats))
+        result['status'] = 'ok'
+        result.update(counts)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+#Expand a directory (all .scd files in it) or a glob pattern into a sorted list of SCD files
+def find_scd_files(source):
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if name.lower().endswith('.scd'))
+    return sorted(glob.glob(source, recursive=True))
+
+#Give every SCD file its own output directory named after the file
+def output_dirs(scd_files, output_root):
+    dirs = []
+    used = set()
+    for scd_file in scd_files:
+        name = os.path.splitext(os.path.basename(scd_file))[0]
+        unique = name
+        n = 1
+        while unique in used:
+            n += 1
+            unique = '%s_%d' % (name, n)
+        used.add(unique)
+        dirs.append(os.path.join(output_root, unique))
+    return dirs
+
+#Convert many SCD files in a process pool. Every worker loads the language once. Writes the
+#threat_model.yml / ag.yml / post_ag.yml of each file to its own directory under output_root
+#and a summary.json with the timings (per stage for converted files) and failures, and returns the summary.
+#With an output_cache directory, files whose outputs are cached are copied instead of converted.
+def run_batch(sources, output_root, lang_file='sasLang', workers=None, streaming=True,
+              cache_dir=LANG_CACHE_DIR, output_cache=None, output_cache_size=DEFAULT_MAX_SIZE, formats=('yml',)):
+    if isinstance(sources, str):
+        sources = [sources]
+    scd_files = [scd_file for source in sources for scd_file in find_scd_files(source)]
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    #Compile the language once here so the workers load it from the cache
+    if cache_dir is not None:
+        load_lang_graph(lang_file, cache_dir)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(lang_file, cache_dir, output_cache, output_cache_size)) as executor:
+        futures = {executor.submit(convert_file, scd_file, output_dir, streaming, formats): (scd_file, output_dir)
+                   for scd_file, output_dir in zip(scd_files, output_dirs(scd_files, output_root))}
+        for future in as_completed(futures):
+            scd_file, output_dir = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                #A worker died (e.g. out of memory), the remaining files of the pool fail with it
+                result = {'scd_file': scd_file, 'output_dir': output_dir, 'status': 'failed',
+                          'error': '%s: %s' % (type(e).__name__, e), 'seconds': None}
+            if result['status'] == 'ok':
+                logger.info('%s %s in %.2fs', 'Copied cached outputs of' if result['cached'] else 'Converted',
+                            scd_file, result['seconds'])
+            else:
+                logger.error('Failed to convert %s: %s', scd_file, result['error'])
+            results.append(result)
+
+    results.sort(key=lambda result: result['scd_file'])
+    summary = {
+        'workers': workers,
+        'files': len(results),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'cached': sum(bool(result.get('cached')) for result in results),
+        'seconds': time.perf_counter() - start,
+        'results': results,
+    }
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def main():
+    argParser = argparse.ArgumentParser(
+        description='Convert a directory or glob of SCD files into threat models and attack graphs.')
+    argParser.add_argument('sources', nargs='+', help='directories or glob patterns of SCD files')
+    argParser.add_argument('-o', '--output', default='output', help='output root directory')
+    argParser.add_argument('-l', '--lang', default='sasLang', help='the sasLang .mar archive')
+    argParser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes')
+    argParser.add_argument('--no-streaming', action='store_true', help='load each SCD file with ET.parse')
+    argParser.add_argument('--binary', action='store_true',
+                           help='also write the threat model and attack graphs in the binary columnar format')
+    argParser.add_argument('-c', '--cache', default=None, help='reuse the outputs of SCD files stored in this cache directory')
+    argParser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_SIZE // 1024 ** 2,
+                           help='maximum size of the output cache in MB')
+    args = argParser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s')
+    logger.setLevel(logging.INFO)
+    summary = run_batch(args.sources, args.output, args.lang, args.workers, not args.no_streaming,
+                        output_cache=args.cache, output_cache_size=args.cache_size * 1024 ** 2,
+                        formats=('yml', 'sclc') if args.binary else ('yml',))
+    print('%d files, %d succeeded (%d cached), %d failed in %.2fs with %d workers'
+          % (summary['files'], summary['succeeded'], summary['cached'], summary['failed'], summary['seconds'],
+             summary['workers']))
+    for result in summary['results']:
+        if result['status'] != 'ok':
+            print('   failed: %s: %s' % (result['scd_file'], result['error']))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,114 @@
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from scl_synthetic import generate_scd, scale_parameters
+
+logger = logging.getLogger(__name__)
+
+#Stages of the Profiler that read the SCD file and build the model, the attack graph and the outputs
+PARSE_STAGES = ('xml_load', 'communication', 'substation', 'ied')
+GRAPH_STAGES = ('attack_graph', 'apriori', 'attach_attackers')
+
+#Generate the SCD file of one scale and run the pipeline on it. Runs in its own process so that
+#the peak RSS is the one of this size only.
+def benchmark_scale(scale, work_dir, lang_file, streaming, formats):
+    from scl_parser_v1 import SclParser, run_pipeline
+    from scl_profile import Profiler
+
+    scale_dir = os.path.join(work_dir, 'scale_%d' % scale)
+    os.makedirs(scale_dir, exist_ok=True)
+    scd_file = os.path.join(scale_dir, 'synthetic.scd')
+    elements = sum(generate_scd(scd_file, **scale_parameters(scale)).values())
+    parser = SclParser(lang_file)
+
+    profiler = Profiler()
+    start = time.perf_counter()
+    run_pipeline(parser, scd_file, scale_dir, streaming, formats, profiler)
+    seconds = time.perf_counter() - start
+
+    profile = profiler.to_dict()
+    stageSeconds = {stage['name']: stage['seconds'] for stage in profile['stages']}
+    parseSeconds = sum(stageSeconds.get(name, 0.0) for name in PARSE_STAGES)
+    return {
+        'scale': scale,
+        'scd_bytes': os.path.getsize(scd_file),
+        'elements': elements,
+        'assets': profile['assets'],
+        'associations': profile['associations'],
+        'attack_steps': profile['attack_steps'],
+        'seconds': seconds,
+        'parse_seconds': parseSeconds,
+        'graph_seconds': sum(stageSeconds.get(name, 0.0) for name in GRAPH_STAGES),
+        'save_seconds': sum(stageTime for name, stageTime in stageSeconds.items() if name.startswith('save ')),
+        'elements_per_second': elements / parseSeconds if parseSeconds else None,
+        'assets_per_second': profile['assets'] / parseSeconds if parseSeconds else None,
+        'peak_rss_mb': profile['process_peak_rss_mb'],
+        'stages': profile['stages'],
+    }
+
+#Exponent k of time ~ elements^k between two sizes, 1 for linear scaling
+def scaling_exponent(smaller, larger, key):
+    if smaller[key] <= 0 or larger[key] <= 0 or larger['elements'] == smaller['elements']:
+        return None
+    return math.log(larger[key] / smaller[key]) / math.log(larger['elements'] / smaller['elements'])
+
+#Run the pipeline on synthetic SCD files of the given scales (see scl_synthetic.scale_parameters)
+#and return the results with the scaling exponents of the parse and total times between sizes
+def run_benchmark(scales, work_dir, lang_file='sasLang', streaming=True, formats=('yml',)):
+    results = []
+    for scale in scales:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(benchmark_scale, scale, work_dir, lang_file, streaming, formats).result()
+        if results:
+            result['parse_scaling'] = scaling_exponent(results[-1], result, 'parse_seconds')
+            result['total_scaling'] = scaling_exponent(results[-1], result, 'seconds')
+        logger.info('Scale %d: %d elements, %d assets in %.2fs', scale, result['elements'], result['assets'],
+                    result['seconds'])
+        results.append(result)
+    return results
+
+def _format(value, spec):
+    return spec % value if value is not None else '-'
+
+def print_results(results):
+    print('%6s %9s %8s %9s %10s %9s %9s %9s %9s %11s %9s %9s %9s'
+          % ('scale', 'elements', 'assets', 'ag steps', 'total s', 'parse s', 'graph s', 'save s',
+             'elem/s', 'assets/s', 'RSS MB', 'parse k', 'total k'))
+    for result in results:
+        print('%6d %9d %8d %9d %10.2f %9.2f %9.2f %9.2f %9s %11s %9s %9s %9s'
+              % (result['scale'], result['elements'], result['assets'], result['attack_steps'],
+                 result['seconds'], result['parse_seconds'], result['graph_seconds'], result['save_seconds'],
+                 _format(result['elements_per_second'], '%.0f'), _format(result['assets_per_second'], '%.0f'),
+                 _format(result['peak_rss_mb'], '%.0f'), _format(result.get('parse_scaling'), '%.2f'),
+                 _format(result.get('total_scaling'), '%.2f')))
+    print('k: time ~ elements^k between a size and the previous one, 1 is linear')
+
+
+def main():
+    argParser = argparse.ArgumentParser(
+        description='Benchmark the pipeline on synthetic SCD files of increasing size.')
+    argParser.add_argument('-s', '--scales', type=int, nargs='+', default=[1, 2, 4],
+                           help='the sizes to run, in substations (see scl_synthetic.scale_parameters)')
+    argParser.add_argument('-o', '--output', default='benchmark', help='directory for the SCD files and outputs')
+    argParser.add_argument('-l', '--lang', default='sasLang', help='the sasLang .mar archive')
+    argParser.add_argument('--no-streaming', action='store_true', help='load each SCD file with ET.parse')
+    argParser.add_argument('--binary', action='store_true', help='write the binary columnar outputs instead of YAML')
+    args = argParser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s')
+    logger.setLevel(logging.INFO)
+    results = run_benchmark(args.scales, args.output, os.path.abspath(args.lang), not args.no_streaming,
+                            ('sclc',) if args.binary else ('yml',))
+    with open(os.path.join(args.output, 'benchmark.json'), 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print_results(results)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
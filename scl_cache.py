@@ -0,0 +1,221 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import xml.etree.ElementTree as ET
+
+import maltoolbox
+
+from scl_index import SCL_NS
+
+logger = logging.getLogger(__name__)
+
+#Generated outputs are cached in this directory, one entry per SCD content, language and parser version
+OUTPUT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'scl_parser', 'outputs')
+
+#The least recently used entries are evicted when the cache grows over this size (in bytes)
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+#The outputs of run_pipeline and the formats they can be written in, YAML and the binary
+#columnar format of scl_columnar
+OUTPUTS = ('threat_model', 'ag', 'post_ag')
+OUTPUT_FORMATS = ('yml', 'sclc')
+
+#The query index (see scl_query) is written with the columnar outputs
+QUERY_INDEX_FILE = 'query_index.sclc'
+
+#The files written by run_pipeline for the given formats
+def output_files(formats=('yml',)):
+    files = [output + '.' + outputFormat for outputFormat in formats for output in OUTPUTS]
+    if 'sclc' in formats:
+        files.append(QUERY_INDEX_FILE)
+    return files
+
+#Sections the parser never reads, they are left out of the key so that e.g. a new Header
+#revision of an otherwise unchanged SCD file still hits the cache
+EXCLUDED_TAGS = {SCL_NS + 'Header', SCL_NS + 'Private', SCL_NS + 'DataTypeTemplates'}
+
+#File-like object that hashes what is written to it, so a canonical SCD is never held in memory
+class _HashWriter:
+    def __init__(self):
+        self.sha = hashlib.sha256()
+
+    def write(self, text):
+        self.sha.update(text.encode('utf-8'))
+
+#Return the sha256 hex digest of the canonical (C14N 2.0) form of an SCD file. Attribute order,
+#whitespace between elements, comments and the excluded sections do not change the digest.
+def scd_hash(scdFile):
+    writer = _HashWriter()
+    ET.canonicalize(out=writer, from_file=scdFile, strip_text=True, exclude_tags=EXCLUDED_TAGS)
+    return writer.sha.hexdigest()
+
+#Return the sha256 hex digest of a file
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def _dir_size(path):
+    size = 0
+    for name in os.listdir(path):
+        try:
+            size += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return size
+
+#Persistent content-addressed cache of the threat_model.yml, ag.yml and post_ag.yml of an SCD file.
+#Entries are directories named after their key, their modification time is the last use and the
+#least recently used ones are evicted once the cache is larger than max_size. Entries are written
+#to a temporary directory and renamed, so several processes can share a cache directory.
+class OutputCache:
+    def __init__(self, cache_dir=OUTPUT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    #The key of the outputs of an SCD file, a hash of the canonical SCD, the language archive,
+    #the parser version and the maltoolbox version
+    def key(self, scd_file, lang_file, parser_version):
+        sha = hashlib.sha256()
+        for part in (scd_hash(scd_file), file_hash(lang_file), str(parser_version), maltoolbox.__version__):
+            sha.update(part.encode('utf-8'))
+            sha.update(b'\0')
+        return sha.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    #Copy the cached output files of key to output_dir and return the info stored with them,
+    #or return None on a cache miss
+    def get(self, key, output_dir, files=output_files()):
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, 'info.json'), encoding='utf-8') as f:
+                info = json.load(f)
+            os.makedirs(output_dir, exist_ok=True)
+            for name in files:
+                shutil.copyfile(os.path.join(entry, name), os.path.join(output_dir, name))
+            os.utime(entry)
+        except (OSError, ValueError):
+            #Not cached, or evicted by another process while it was being read
+            self.misses += 1
+            self._record('misses')
+            return None
+        self.hits += 1
+        self._record('hits')
+        logger.info('Output cache hit %s', key)
+        return info
+
+    #Store the output files in output_dir under key together with info (e.g. the asset counts)
+    def put(self, key, output_dir, info=None, files=output_files()):
+        entry = self._entry(key)
+        tmpEntry = '%s.%d.tmp' % (entry, os.getpid())
+        try:
+            os.makedirs(tmpEntry, exist_ok=True)
+            for name in files:
+                shutil.copyfile(os.path.join(output_dir, name), os.path.join(tmpEntry, name))
+            with open(os.path.join(tmpEntry, 'info.json'), 'w', encoding='utf-8') as f:
+                json.dump(info or {}, f)
+            if os.path.isdir(entry) and not all(os.path.exists(os.path.join(entry, name)) for name in files):
+                #The entry was stored with other formats, replace it
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.rename(tmpEntry, entry)
+            except OSError:
+                #Another process stored the same outputs first
+                shutil.rmtree(tmpEntry, ignore_errors=True)
+                os.utime(entry)
+        except OSError as e:
+            shutil.rmtree(tmpEntry, ignore_errors=True)
+            logger.warning('Could not store the outputs in the cache %s (%s)', self.cache_dir, e)
+            return
+        self.evict()
+
+    #Remove least recently used entries until the cache fits in max_size
+    def evict(self, max_size=None):
+        max_size = self.max_size if max_size is None else max_size
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path) and not name.endswith('.tmp'):
+                try:
+                    entries.append((os.path.getmtime(path), _dir_size(path), path))
+                except OSError:
+                    pass
+        size = sum(entrySize for _, entrySize, _ in entries)
+        for _, entrySize, path in sorted(entries):
+            if size <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            size -= entrySize
+            self.evictions += 1
+            self._record('evictions')
+            logger.info('Evicted %s from the output cache', os.path.basename(path))
+
+    #Add one to a counter of the statistics shared by all users of the cache directory. Concurrent
+    #updates from several processes can lose counts, the statistics are only indicative.
+    def _record(self, counter):
+        counts = self._counts()
+        counts[counter] += 1
+        statsFile = os.path.join(self.cache_dir, 'stats.json')
+        tmpFile = '%s.%d.tmp' % (statsFile, os.getpid())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmpFile, 'w', encoding='utf-8') as f:
+                json.dump(counts, f)
+            os.replace(tmpFile, statsFile)
+        except OSError:
+            pass
+
+    def _counts(self):
+        counts = {'hits': 0, 'misses': 0, 'evictions': 0}
+        try:
+            with open(os.path.join(self.cache_dir, 'stats.json'), encoding='utf-8') as f:
+                counts.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return counts
+
+    #The hit, miss and eviction counts of the cache directory, with its number of entries and size
+    def stats(self):
+        counts = self._counts()
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                       if not name.endswith('.tmp') and os.path.isdir(os.path.join(self.cache_dir, name))]
+        counts['entries'] = len(entries)
+        counts['size'] = sum(_dir_size(entry) for entry in entries)
+        return counts
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def main():
+    argParser = argparse.ArgumentParser(description='Show the statistics of the output cache or clear it.')
+    argParser.add_argument('command', choices=('stats', 'clear'))
+    argParser.add_argument('-c', '--cache', default=OUTPUT_CACHE_DIR, help='the output cache directory')
+    args = argParser.parse_args()
+
+    cache = OutputCache(args.cache)
+    if args.command == 'clear':
+        cache.clear()
+        return 0
+    counts = cache.stats()
+    lookups = counts['hits'] + counts['misses']
+    print('%d entries, %.1f MB' % (counts['entries'], counts['size'] / 1024 ** 2))
+    print('%d hits, %d misses (%.0f%% hit rate), %d evictions'
+          % (counts['hits'], counts['misses'], 100.0 * counts['hits'] / lookups if lookups else 0, counts['evictions']))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,357 @@
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+
+from maltoolbox.attackgraph import AttackGraph, Attacker
+from maltoolbox.attackgraph.node import AttackGraphNode
+from maltoolbox.exceptions import DuplicateModelAssociationError
+from maltoolbox.model import Model, AttackerAttachment
+
+from scl_tables import add_associations
+
+#Binary columnar files start with MAGIC, the format version and the length of a JSON header.
+#The header describes the sections of the file, each one a typed array (see the array module)
+#starting at an 8 byte aligned offset, so that a reader can map the file and use the sections in place.
+MAGIC = b'SCLC'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sII')
+ALIGNMENT = 8
+
+#Bits of the node flags column
+EXISTENCE_KNOWN = 1
+EXISTS = 2
+VIABLE = 4
+NECESSARY = 8
+
+#The value of an absent string column entry
+NO_STRING = -1
+
+#Interns strings into a table of UTF-8 data and offsets, every distinct string is stored once
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+
+    def add(self, text):
+        if text is None:
+            return NO_STRING
+        i = self.index.get(text)
+        if i is None:
+            i = self.index[text] = len(self.offsets) - 1
+            self.data += text.encode('utf-8')
+            self.offsets.append(len(self.data))
+        return i
+
+#Collects the sections of a columnar file and writes them with their header
+class _ColumnarWriter:
+    def __init__(self, kind, metadata):
+        self.kind = kind
+        self.metadata = metadata
+        self.strings = _StringTable()
+        self.sections = {}
+
+    def add(self, name, typecode, values):
+        self.sections[name] = values if isinstance(values, array) else array(typecode, values)
+
+    def write(self, filename):
+        self.sections['strings_offsets'] = self.strings.offsets
+        self.sections['strings_data'] = array('B', bytes(self.strings.data))
+        #The header holds the section offsets, which depend on the header length, so lay out the
+        #sections with a header length that is padded to stay stable
+        layout = {}
+        headerLength = 0
+        while True:
+            offset = _align(PREAMBLE.size + headerLength)
+            for name, values in self.sections.items():
+                layout[name] = [values.typecode, offset, len(values)]
+                offset = _align(offset + len(values) * values.itemsize)
+            header = json.dumps({'kind': self.kind, 'byteorder': sys.byteorder,
+                                 'metadata': self.metadata, 'sections': layout}).encode('utf-8')
+            if len(header) <= headerLength:
+                break
+            headerLength = _align(len(header) + 64)
+        header = header.ljust(headerLength)
+        with open(filename, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, headerLength))
+            f.write(header)
+            for name, values in self.sections.items():
+                f.write(b'\0' * (layout[name][1] - f.tell()))
+                values.tofile(f)
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+#A memory mapped columnar file. Sections are read only memoryviews of the mapped file, they are
+#not copied, so opening a file is independent of its size and processes share the pages.
+#The views returned by section and row are only valid while the file is open, and close raises
+#BufferError while one of them is still referenced: copy what must outlive the file (list(view),
+#view.tolist(), bytes(view)) and release or drop the views before closing.
+class ColumnarFile:
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, headerLength = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('%s is not a columnar SCL file' % filename)
+        if version != FORMAT_VERSION:
+            raise ValueError('%s has format version %d, expected %d' % (filename, version, FORMAT_VERSION))
+        header = json.loads(bytes(self._mmap[PREAMBLE.size:PREAMBLE.size + headerLength]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError('%s was written on a %s endian machine' % (filename, header['byteorder']))
+        self.kind = header['kind']
+        self.metadata = header['metadata']
+        self._layout = header['sections']
+        self._view = memoryview(self._mmap)
+        self._sections = {}
+        self._strings = {}
+
+    def section(self, name):
+        view = self._sections.get(name)
+        if view is None:
+            typecode, offset, count = self._layout[name]
+            itemsize = array(typecode).itemsize
+            view = self._sections[name] = self._view[offset:offset + count * itemsize].cast(typecode)
+        return view
+
+    #The interned string i, or None for NO_STRING
+    def string(self, i):
+        if i == NO_STRING:
+            return None
+        text = self._strings.get(i)
+        if text is None:
+            offsets = self.section('strings_offsets')
+            text = self._strings[i] = bytes(self.section('strings_data')[offsets[i]:offsets[i + 1]]).decode('utf-8')
+        return text
+
+    #The entries of a CSR (offsets, values) pair of sections for row i
+    def row(self, name, i):
+        offsets = self.section(name + '_offsets')
+        return self.section(name)[offsets[i]:offsets[i + 1]]
+
+    def close(self):
+        for view in self._sections.values():
+            view.release()
+        self._sections = {}
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+def _add_csr(writer, name, rows):
+    offsets = array('q', [0])
+    values = array('q')
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+    writer.add(name + '_offsets', 'q', offsets)
+    writer.add(name, 'q', values)
+
+#------------------Instance model-----------------
+#Save an instance model in the columnar format. Assets are rows of the asset_id / asset_type /
+#asset_name columns, defenses that are set are (row, defense, value) triplets and the assets of
+#each side of an association are CSR lists of asset ids.
+def save_model(instance_model, filename):
+    lang_graph = instance_model.lang_classes_factory.lang_graph
+    writer = _ColumnarWriter('model', {
+        'name': instance_model.name,
+        'langVersion': lang_graph.metadata['version'],
+        'langID': lang_graph.metadata['id'],
+    })
+    strings = writer.strings
+    assetIds, assetTypes, assetNames = array('q'), array('i'), array('i')
+    defenseRows, defenseNames, defenseValues = array('q'), array('i'), array('d')
+    extras = {}
+    for row, asset in enumerate(instance_model.assets):
+        assetIds.append(int(asset.id))
+        assetTypes.append(strings.add(str(asset.type)))
+        assetNames.append(strings.add(str(asset.name)))
+        _, assetDict = instance_model.asset_to_dict(asset)
+        for defense, value in assetDict.get('defenses', {}).items():
+            defenseRows.append(row)
+            defenseNames.append(strings.add(defense))
+            defenseValues.append(float(value))
+        if 'extras' in assetDict:
+            extras[row] = assetDict['extras']
+    writer.add('asset_id', 'q', assetIds)
+    writer.add('asset_type', 'i', assetTypes)
+    writer.add('asset_name', 'i', assetNames)
+    writer.add('defense_row', 'q', defenseRows)
+    writer.add('defense_name', 'i', defenseNames)
+    writer.add('defense_value', 'd', defenseValues)
+
+    associationTypes, leftFields, rightFields = array('i'), array('i'), array('i')
+    lefts, rights = [], []
+    for association in instance_model.associations:
+        leftFieldName, rightFieldName = instance_model.get_association_field_names(association)
+        associationTypes.append(strings.add(association.__class__.__name__))
+        leftFields.append(strings.add(str(leftFieldName)))
+        rightFields.append(strings.add(str(rightFieldName)))
+        lefts.append(int(asset.id) for asset in getattr(association, leftFieldName))
+        rights.append(int(asset.id) for asset in getattr(association, rightFieldName))
+    writer.add('association_type', 'i', associationTypes)
+    writer.add('association_left_field', 'i', leftFields)
+    writer.add('association_right_field', 'i', rightFields)
+    _add_csr(writer, 'association_left', lefts)
+    _add_csr(writer, 'association_right', rights)
+
+    writer.metadata['asset_extras'] = extras
+    writer.metadata['attackers'] = [instance_model.attacker_to_dict(attacker) for attacker in instance_model.attackers]
+    writer.write(filename)
+
+#Load an instance model saved by save_model
+def load_model(filename, lang_classes_factory):
+    with ColumnarFile(filename) as columns:
+        if columns.kind != 'model':
+            raise ValueError('%s holds a %s, not a model' % (filename, columns.kind))
+        instance_model = Model(columns.metadata['name'], lang_classes_factory)
+        assets = {}
+        assetTypes, assetNames, extras = columns.section('asset_type'), columns.section('asset_name'), \
+            columns.metadata['asset_extras']
+        for row, assetId in enumerate(columns.section('asset_id')):
+            asset = getattr(lang_classes_factory.ns, columns.string(assetTypes[row]))(
+                name = columns.string(assetNames[row]))
+            if str(row) in extras:
+                asset.extras = extras[str(row)]
+            instance_model.add_asset(asset, asset_id = assetId)
+            assets[assetId] = asset
+        assetIds = columns.section('asset_id')
+        for row, name, value in zip(columns.section('defense_row'), columns.section('defense_name'),
+                                    columns.section('defense_value')):
+            setattr(assets[assetIds[row]], columns.string(name), value)
+
+        #Duplicates are checked with a set of (type, left asset, right asset) connections and the
+        #associations are added in bulk, Model.add_association makes loading quadratic
+        connections = set()
+        associations = []
+        leftFields, rightFields = columns.section('association_left_field'), columns.section('association_right_field')
+        for row, associationType in enumerate(columns.section('association_type')):
+            typeName = columns.string(associationType)
+            leftIds, rightIds = list(columns.row('association_left', row)), list(columns.row('association_right', row))
+            for leftId in leftIds:
+                for rightId in rightIds:
+                    if (typeName, leftId, rightId) in connections:
+                        raise DuplicateModelAssociationError('Association type %s already exists between %s and %s'
+                                                             % (typeName, assets[leftId].name, assets[rightId].name))
+                    connections.add((typeName, leftId, rightId))
+            association = getattr(lang_classes_factory.ns, typeName)()
+            leftAssets, rightAssets = [assets[assetId] for assetId in leftIds], [assets[assetId] for assetId in rightIds]
+            setattr(association, columns.string(leftFields[row]), leftAssets)
+            setattr(association, columns.string(rightFields[row]), rightAssets)
+            associations.append((association, leftAssets + rightAssets))
+        add_associations(instance_model, associations)
+
+        for attackerId, attackerDict in columns.metadata['attackers']:
+            attacker = AttackerAttachment(name = attackerDict['name'])
+            attacker.entry_points = [(assets[int(assetId)], entryPoint['attack_steps'])
+                                     for assetId, entryPoint in attackerDict['entry_points'].items()]
+            instance_model.add_attacker(attacker, attacker_id = attackerId)
+    return instance_model
+
+#------------------Attack graph-----------------
+#Save an attack graph in the columnar format. Nodes are rows of the node_* columns, with the
+#asset name, attack step name, type, ttc, mitre info and tags interned, the boolean statuses packed
+#in node_flags and a NaN defense status for nodes that are not defenses. Children and parents are
+#CSR lists of node ids.
+def save_attack_graph(attack_graph, filename):
+    writer = _ColumnarWriter('attack_graph', {})
+    strings = writer.strings
+    ids, types, names, assets = array('q'), array('i'), array('i'), array('i')
+    ttcs, mitreInfos, tags = array('i'), array('i'), array('i')
+    defenses, flags = array('d'), array('B')
+    extras = {}
+    for row, ag_node in enumerate(attack_graph.nodes):
+        ids.append(ag_node.id)
+        types.append(strings.add(ag_node.type))
+        names.append(strings.add(ag_node.name))
+        assets.append(strings.add(str(ag_node.asset.name)) if ag_node.asset is not None else NO_STRING)
+        ttcs.append(strings.add(json.dumps(ag_node.ttc, sort_keys=True)) if ag_node.ttc is not None else NO_STRING)
+        mitreInfos.append(strings.add(str(ag_node.mitre_info)) if ag_node.mitre_info is not None else NO_STRING)
+        tags.append(strings.add(json.dumps(ag_node.tags)) if ag_node.tags else NO_STRING)
+        defenses.append(float(ag_node.defense_status) if ag_node.defense_status is not None else math.nan)
+        flags.append((EXISTENCE_KNOWN if ag_node.existence_status is not None else 0) |
+                     (EXISTS if ag_node.existence_status else 0) |
+                     (VIABLE if ag_node.is_viable else 0) |
+                     (NECESSARY if ag_node.is_necessary else 0))
+        if ag_node.extras:
+            extras[row] = ag_node.extras
+    for name, typecode, values in (('node_id', 'q', ids), ('node_type', 'i', types), ('node_name', 'i', names),
+                                   ('node_asset', 'i', assets), ('node_ttc', 'i', ttcs),
+                                   ('node_mitre_info', 'i', mitreInfos), ('node_tags', 'i', tags),
+                                   ('node_defense_status', 'd', defenses), ('node_flags', 'B', flags)):
+        writer.add(name, typecode, values)
+    _add_csr(writer, 'node_children', ((child.id for child in ag_node.children) for ag_node in attack_graph.nodes))
+    _add_csr(writer, 'node_parents', ((parent.id for parent in ag_node.parents) for ag_node in attack_graph.nodes))
+    writer.metadata['node_extras'] = extras
+    writer.metadata['attackers'] = [{
+        'id': attacker.id,
+        'name': attacker.name,
+        'entry_points': [ag_node.id for ag_node in attacker.entry_points],
+        'reached_attack_steps': [ag_node.id for ag_node in attacker.reached_attack_steps],
+    } for attacker in attack_graph.attackers]
+    writer.write(filename)
+
+#Load an attack graph saved by save_attack_graph, linking the nodes to the assets of model if given
+def load_attack_graph(filename, model=None):
+    with ColumnarFile(filename) as columns:
+        if columns.kind != 'attack_graph':
+            raise ValueError('%s holds a %s, not an attack graph' % (filename, columns.kind))
+        attack_graph = AttackGraph()
+        attack_graph.model = model
+        string = columns.string
+        types, names, assets = columns.section('node_type'), columns.section('node_name'), columns.section('node_asset')
+        ttcs, mitreInfos, tags = columns.section('node_ttc'), columns.section('node_mitre_info'), columns.section('node_tags')
+        defenses, flags, extras = columns.section('node_defense_status'), columns.section('node_flags'), \
+            columns.metadata['node_extras']
+        nodeIds = columns.section('node_id')
+        #Model.get_asset_by_name scans all the assets, look the assets up by name once
+        assetsByName = {str(asset.name): asset for asset in model.assets} if model is not None else {}
+        assetNodes = {}
+        for row, nodeId in enumerate(nodeIds):
+            node_asset = None
+            if model is not None and assets[row] != NO_STRING:
+                node_asset = assetsByName.get(string(assets[row]))
+                if node_asset is None:
+                    raise LookupError('Failed to find asset %s when loading the attack graph %s'
+                                      % (string(assets[row]), filename))
+            ttc = string(ttcs[row])
+            ag_node = AttackGraphNode(
+                type = string(types[row]),
+                name = string(names[row]),
+                ttc = json.loads(ttc) if ttc is not None else None,
+                asset = node_asset,
+                defense_status = None if math.isnan(defenses[row]) else defenses[row],
+                existence_status = bool(flags[row] & EXISTS) if flags[row] & EXISTENCE_KNOWN else None,
+                is_viable = bool(flags[row] & VIABLE),
+                is_necessary = bool(flags[row] & NECESSARY),
+                mitre_info = string(mitreInfos[row]),
+                tags = json.loads(string(tags[row])) if tags[row] != NO_STRING else [],
+                extras = extras.get(str(row), {})
+            )
+            if node_asset is not None:
+                assetNodes.setdefault(id(node_asset), (node_asset, []))[1].append(ag_node)
+            attack_graph.add_node(ag_node, node_id = nodeId)
+        for node_asset, ag_nodes in assetNodes.values():
+            node_asset.attack_step_nodes = list(getattr(node_asset, 'attack_step_nodes', [])) + ag_nodes
+
+        get_node = attack_graph._id_to_node.__getitem__
+        for row, nodeId in enumerate(nodeIds):
+            ag_node = get_node(nodeId)
+            ag_node.children = [get_node(childId) for childId in columns.row('node_children', row)]
+            ag_node.parents = [get_node(parentId) for parentId in columns.row('node_parents', row)]
+
+        for attackerDict in columns.metadata['attackers']:
+            attack_graph.add_attacker(
+                attacker = Attacker(name = attackerDict['name'], entry_points = [], reached_attack_steps = []),
+                attacker_id = attackerDict['id'],
+                entry_points = attackerDict['entry_points'],
+                reached_attack_steps = attackerDict['reached_attack_steps'])
+    return attack_graph
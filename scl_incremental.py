@@ -0,0 +1,391 @@
+import logging
+import re
+
+from maltoolbox.attackgraph import AttackGraph
+from maltoolbox.attackgraph.node import AttackGraphNode
+from maltoolbox.attackgraph.attackgraph import _process_step_expression
+from maltoolbox.exceptions import AttackGraphStepExpressionError
+
+from scl_apriori import calculate_viability_and_necessity, update_viability_and_necessity
+from scl_index import SCL_NS, SclIndex, scd_sections
+
+logger = logging.getLogger(__name__)
+
+#Suffixes the Model appends to duplicate asset names (':<id>', possibly repeated)
+DUPLICATE_NAME_SUFFIX = re.compile(r'(:\d+)+$')
+
+#------------------SCD element diff-----------------
+def _attributes(elem):
+    return tuple(sorted(elem.attrib.items()))
+
+#Read an SCD file and return {element key: signature} in document order for the elements the parser uses.
+#Keys identify an element by its type and the names of its SCL ancestors, e.g.
+#('Bay', substation, voltageLevel, bay) or ('LN', ied, ldInst, lnClass, prefix, inst), and the
+#signature holds the attributes (and for Bays, ConductingEquipment and IEDs the LNodes/LNs) it is built from.
+def scd_elements(scdFile):
+    elements = {}
+    for elem in scd_sections(scdFile):
+        if elem.tag in (SCL_NS + 'Communication', SCL_NS + 'Substation', SCL_NS + 'IED'):
+            _add_section_elements(elements, elem, SclIndex(elem))
+    return elements
+
+def _add_section_elements(elements, section, index):
+    for subNetwork in index.elements('SubNetwork'):
+        snName = subNetwork.attrib['name']
+        elements[('SubNetwork', snName)] = _attributes(subNetwork)
+        for connectedAP in index.descendants(subNetwork, 'ConnectedAP'):
+            elements[('ConnectedAP', snName, connectedAP.attrib['iedName'], connectedAP.attrib['apName'])] = \
+                _attributes(connectedAP)
+    for substation in index.elements('Substation'):
+        subName = substation.attrib['name']
+        elements[('Substation', subName)] = (
+            _attributes(substation),
+            tuple(_attributes(pt) for pt in index.descendants(substation, 'PowerTransformer')),
+            tuple(_attributes(lnode) for lnode in index.children(substation, 'LNode')))
+        for vl in index.descendants(substation, 'VoltageLevel'):
+            vlName = vl.attrib['name']
+            elements[('VoltageLevel', subName, vlName)] = _attributes(vl)
+            for bay in index.descendants(vl, 'Bay'):
+                bayName = bay.attrib['name']
+                elements[('Bay', subName, vlName, bayName)] = (
+                    _attributes(bay),
+                    tuple(_attributes(lnode) for lnode in index.children(bay, 'LNode')))
+                for conEq in index.descendants(bay, 'ConductingEquipment'):
+                    elements[('ConductingEquipment', subName, vlName, bayName, conEq.attrib['name'])] = (
+                        _attributes(conEq),
+                        tuple(_attributes(lnode) for lnode in index.descendants(conEq, 'LNode')))
+    for ied in index.elements('IED'):
+        iedName = ied.attrib['name']
+        elements[('IED', iedName)] = (
+            _attributes(ied),
+            tuple((ap.attrib.get('name'), tuple(_attributes(ln) for ln in index.children(ap, 'LN')))
+                  for ap in index.children(ied, 'AccessPoint')))
+        for lDevice in index.descendants(ied, 'LDevice'):
+            ldInst = lDevice.attrib['inst']
+            elements[('LDevice', iedName, ldInst)] = _attributes(lDevice)
+            for ln in index.children(lDevice, 'LN'):
+                elements[('LN', iedName, ldInst, ln.attrib['lnClass'], ln.attrib.get('prefix', ''), ln.attrib['inst'])] = \
+                    _attributes(ln)
+
+#Element level difference between two revisions of an SCD file. added, removed and changed are lists of
+#element keys (see scd_elements) and reordered is True when elements present in both revisions moved.
+class SclDiff:
+    def __init__(self, oldElements, newElements):
+        self.added = [key for key in newElements if key not in oldElements]
+        self.removed = [key for key in oldElements if key not in newElements]
+        self.changed = [key for key in newElements if key in oldElements and oldElements[key] != newElements[key]]
+        self.reordered = [key for key in oldElements if key in newElements] != \
+                         [key for key in newElements if key in oldElements]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.reordered)
+
+    #Number of added, removed and changed elements per element type
+    def counts(self):
+        counts = {}
+        for change in ('added', 'removed', 'changed'):
+            for key in getattr(self, change):
+                counts.setdefault(key[0], {'added': 0, 'removed': 0, 'changed': 0})[change] += 1
+        return counts
+
+    def __repr__(self):
+        return 'SclDiff(%d added, %d removed, %d changed%s)' % (
+            len(self.added), len(self.removed), len(self.changed), ', reordered' if self.reordered else '')
+
+def diff_scd(oldScdFile, newScdFile):
+    return SclDiff(scd_elements(oldScdFile), scd_elements(newScdFile))
+
+#------------------Model identities-----------------
+#Give every asset of a parsed model an identity that is stable across SCD revisions:
+#(SCL element key, asset type, asset name without duplicate suffix, ordinal). The units are the
+#(key, first asset, first association) marks recorded by SclParser while the model was built.
+def asset_identities(model, units):
+    identities = {}
+    ordinals = {}
+    bounds = [start for _, start, _ in units[1:]] + [len(model.assets)]
+    for (key, start, _), end in zip(units, bounds):
+        for asset in model.assets[start:end]:
+            base = (key, str(asset.type), DUPLICATE_NAME_SUFFIX.sub('', str(asset.name)))
+            ordinal = ordinals.get(base, 0)
+            ordinals[base] = ordinal + 1
+            identities[base + (ordinal,)] = asset
+    return identities
+
+def association_identity(model, association, identityOf):
+    return (association.__class__.__name__,) + tuple(
+        (fieldName, tuple(sorted(identityOf[id(asset)] for asset in getattr(association, fieldName))))
+        for fieldName in model.get_association_field_names(association))
+
+#------------------Attack graph with dependencies-----------------
+#Stands in for the model while attack step expressions are resolved and records which
+#(asset id, field name) lookups every attack step node depends on.
+class _DependencyRecorder:
+    def __init__(self, model):
+        self.model = model
+        self.node = None
+        #(asset id, field name) -> ids of the nodes that resolved this field on this asset
+        self.dependents = {}
+        #node id -> the (asset id, field name) lookups of the node
+        self.lookups = {}
+
+    def get_associated_assets_by_field_name(self, asset, field_name):
+        key = (int(asset.id), field_name)
+        self.dependents.setdefault(key, set()).add(self.node.id)
+        self.lookups.setdefault(self.node.id, set()).add(key)
+        return self.model.get_associated_assets_by_field_name(asset, field_name)
+
+    def forget(self, node):
+        for key in self.lookups.pop(node.id, ()):
+            dependents = self.dependents.get(key)
+            if dependents is not None:
+                dependents.discard(node.id)
+
+    def nodes_depending_on(self, asset, field_name):
+        return self.dependents.get((int(asset.id), field_name), ())
+
+#Builds the same attack graph as AttackGraph(lang_graph, model) while recording the model lookups of
+#every node, so that after a model change only the nodes that read a changed association are relinked.
+class DependencyAttackGraph:
+    def __init__(self, lang_graph, model):
+        self.lang_graph = lang_graph
+        self.model = model
+        self.recorder = _DependencyRecorder(model)
+        self.attack_graph = AttackGraph(lang_graph)
+        self.attack_graph.model = model
+        for asset in model.assets:
+            self.add_asset_nodes(asset)
+        for node in list(self.attack_graph.nodes):
+            self.link_node(node)
+
+    #Create the attack step nodes of an asset (see AttackGraph._generate_graph), they are linked by link_node
+    def add_asset_nodes(self, asset):
+        attack_step_nodes = []
+        attack_steps = self.lang_graph._get_attacks_for_asset_type(asset.type)
+        for attack_step_name, attack_step_attribs in attack_steps.items():
+            defense_status = None
+            if attack_step_attribs['type'] == 'defense':
+                defense_status = getattr(asset, attack_step_name)
+            mitre_info = attack_step_attribs['meta']['mitre'] if 'mitre' in \
+                attack_step_attribs['meta'] else None
+            ag_node = AttackGraphNode(
+                type = attack_step_attribs['type'],
+                asset = asset,
+                name = attack_step_name,
+                ttc = attack_step_attribs['ttc'],
+                children = [],
+                parents = [],
+                defense_status = defense_status,
+                existence_status = None,
+                is_viable = True,
+                is_necessary = True,
+                mitre_info = mitre_info,
+                tags = attack_step_attribs['tags'],
+                compromised_by = []
+            )
+            ag_node.attributes = attack_step_attribs
+            attack_step_nodes.append(ag_node)
+            self.attack_graph.add_node(ag_node)
+        asset.attack_step_nodes = attack_step_nodes
+        return attack_step_nodes
+
+    #Resolve the existence status and the children of a node against the current model
+    def link_node(self, ag_node):
+        self.recorder.forget(ag_node)
+        self.recorder.node = ag_node
+        if ag_node.type in ('exist', 'notExist'):
+            (target_assets, _) = _process_step_expression(
+                self.lang_graph, self.recorder, [ag_node.asset],
+                ag_node.attributes['requires']['stepExpressions'][0])
+            ag_node.existence_status = target_assets != []
+
+        step_expressions = ag_node.attributes['reaches']['stepExpressions'] if \
+            isinstance(ag_node.attributes, dict) and ag_node.attributes['reaches'] else []
+        for step_expression in step_expressions:
+            (target_assets, attack_step) = _process_step_expression(
+                self.lang_graph, self.recorder, [ag_node.asset], step_expression)
+            for target in target_assets:
+                target_node_full_name = target.name + ':' + attack_step
+                target_node = self.attack_graph.get_node_by_full_name(target_node_full_name)
+                if not target_node:
+                    raise AttackGraphStepExpressionError(
+                        'Failed to find target node "%s" to link with for attack step "%s"(%d)!'
+                        % (target_node_full_name, ag_node.full_name, ag_node.id))
+                ag_node.children.append(target_node)
+                target_node.parents.append(ag_node)
+
+    #Remove the outgoing links of a node and return its former children
+    def unlink_node(self, ag_node):
+        children = ag_node.children
+        for child in children:
+            child.parents = [parent for parent in child.parents if parent is not ag_node]
+        ag_node.children = []
+        return children
+
+    #Remove nodes from the attack graph and return the remaining nodes that lost a parent
+    def remove_nodes(self, nodes):
+        removedIds = {ag_node.id for ag_node in nodes}
+        orphans = []
+        for ag_node in nodes:
+            self.recorder.forget(ag_node)
+            for child in ag_node.children:
+                if child.id not in removedIds:
+                    child.parents = [parent for parent in child.parents if parent.id not in removedIds]
+                    orphans.append(child)
+            for parent in ag_node.parents:
+                if parent.id not in removedIds:
+                    parent.children = [child for child in parent.children if child.id not in removedIds]
+            del self.attack_graph._id_to_node[ag_node.id]
+            if self.attack_graph._full_name_to_node.get(ag_node.full_name) is ag_node:
+                del self.attack_graph._full_name_to_node[ag_node.full_name]
+        self.attack_graph.nodes = [ag_node for ag_node in self.attack_graph.nodes if ag_node.id not in removedIds]
+        return orphans
+
+#------------------Incremental model-----------------
+#Keeps the model and attack graph of an SCD file and patches them when a new revision of the file
+#is given to update. Only the assets and associations that differ between the revisions are removed
+#or added, only the attack step nodes whose step expressions read a changed association are relinked,
+#and the apriori analysis is only redone downstream of them.
+#The patched model is equivalent to a full rebuild of the new revision, but new assets get new ids.
+#The element diff only decides whether there is anything to do: the changed assets and associations
+#are found by parsing the whole new revision and comparing the identities of all the assets and
+#associations of both models, so that part of an update grows with the size of the file. Only the
+#attack graph and the apriori work are proportional to the change.
+class IncrementalModel:
+    def __init__(self, parser, scdFile, streaming=True):
+        self.parser = parser
+        self.streaming = streaming
+        self.elements = scd_elements(scdFile)
+        self.model = parser.parse(scdFile, streaming)
+        self.identities = asset_identities(self.model, parser.units)
+        self.identityOf = {id(asset): identity for identity, asset in self.identities.items()}
+        self.graph = DependencyAttackGraph(parser.lang_graph, self.model)
+        self.attack_graph = self.graph.attack_graph
+        calculate_viability_and_necessity(self.attack_graph)
+        self.attack_graph.attach_attackers()
+
+    #Patch the model and the attack graph to a new revision of the SCD file and return the SclDiff
+    def update(self, scdFile):
+        newElements = scd_elements(scdFile)
+        diff = SclDiff(self.elements, newElements)
+        if not diff:
+            return diff
+        logger.info('Updating model "%s": %s', self.model.name, diff)
+
+        newModel = self.parser.parse(scdFile, self.streaming)
+        newIdentities = asset_identities(newModel, self.parser.units)
+        newIdentityOf = {id(asset): identity for identity, asset in newIdentities.items()}
+
+        oldAssociations = {association_identity(self.model, association, self.identityOf): association
+                           for association in self.model.associations}
+        newAssociations = {association_identity(newModel, association, newIdentityOf): association
+                           for association in newModel.associations}
+        #Assets only carry their names, so a changed element only changes the associations
+        removedAssets = [asset for identity, asset in self.identities.items() if identity not in newIdentities]
+        addedIdentities = [identity for identity in newIdentities if identity not in self.identities]
+        removedAssociations = [association for identity, association in oldAssociations.items()
+                               if identity not in newAssociations]
+        addedAssociations = [association for identity, association in newAssociations.items()
+                             if identity not in oldAssociations]
+
+        #Nodes that resolved a field through a removed association
+        affected = {}
+        for association in removedAssociations + [association for asset in removedAssets
+                                                   for association in asset.associations]:
+            self._add_dependents(affected, association)
+
+        orphans = self._remove_assets(removedAssets, removedAssociations)
+        addedNodes = []
+        for identity in addedIdentities:
+            asset = newIdentities[identity]
+            asset.name = identity[2]
+            self.model.add_asset(asset)
+            self.identities[identity] = asset
+            self.identityOf[id(asset)] = identity
+            addedNodes.extend(self.graph.add_asset_nodes(asset))
+        for association in addedAssociations:
+            for fieldName in self.model.get_association_field_names(association):
+                setattr(association, fieldName,
+                        [self.identities[newIdentityOf[id(asset)]] for asset in getattr(association, fieldName)])
+            self.model.add_association(association)
+            #Nodes that resolved a field through an asset that gained an association
+            self._add_dependents(affected, association)
+        self._update_attackers(newModel, newIdentityOf)
+
+        for ag_node in affected.values():
+            if self.attack_graph.get_node_by_id(ag_node.id) is ag_node:
+                orphans.extend(self.graph.unlink_node(ag_node))
+        relinked = [ag_node for ag_node in affected.values() if self.attack_graph.get_node_by_id(ag_node.id) is ag_node]
+        for ag_node in relinked + addedNodes:
+            self.graph.link_node(ag_node)
+
+        self._detach_attackers()
+        changed = update_viability_and_necessity(self.attack_graph, relinked + addedNodes + orphans)
+        self.attack_graph.attach_attackers()
+        logger.info('Removed %d and added %d assets, removed %d and added %d associations, '
+                    'relinked %d attack steps, %d changed viability or necessity',
+                    len(removedAssets), len(addedIdentities), len(removedAssociations), len(addedAssociations),
+                    len(relinked) + len(addedNodes), len(changed))
+        #Only a revision that has been applied is recorded, a revision that failed to parse is diffed again
+        self.elements = newElements
+        return diff
+
+    def _add_dependents(self, affected, association):
+        leftFieldName, rightFieldName = self.model.get_association_field_names(association)
+        for leftAsset in getattr(association, leftFieldName):
+            for nodeId in self.graph.recorder.nodes_depending_on(leftAsset, rightFieldName):
+                affected[nodeId] = self.attack_graph.get_node_by_id(nodeId)
+        for rightAsset in getattr(association, rightFieldName):
+            for nodeId in self.graph.recorder.nodes_depending_on(rightAsset, leftFieldName):
+                affected[nodeId] = self.attack_graph.get_node_by_id(nodeId)
+
+    #Remove assets and associations from the model by identity (Model.remove_asset compares assets by
+    #value, which is linear in the model size for every removal) and the nodes of the assets from the graph
+    def _remove_assets(self, assets, associations):
+        assetIds = {id(asset) for asset in assets}
+        associationIds = {id(association) for association in associations}
+        for asset in assets:
+            associationIds.update(id(association) for association in asset.associations)
+        removed = [association for association in self.model.associations if id(association) in associationIds]
+
+        for association in removed:
+            for fieldName in self.model.get_association_field_names(association):
+                for asset in getattr(association, fieldName):
+                    if id(asset) not in assetIds:
+                        asset.associations = [assetAssociation for assetAssociation in asset.associations
+                                              if id(assetAssociation) not in associationIds]
+        self.model.associations = [association for association in self.model.associations
+                                   if id(association) not in associationIds]
+        for associationType in list(self.model._type_to_association):
+            sameType = [association for association in self.model._type_to_association[associationType]
+                        if id(association) not in associationIds]
+            if sameType:
+                self.model._type_to_association[associationType] = sameType
+            else:
+                del self.model._type_to_association[associationType]
+
+        orphans = []
+        for asset in assets:
+            orphans.extend(self.graph.remove_nodes(getattr(asset, 'attack_step_nodes', [])))
+            self.model.asset_ids.discard(int(asset.id))
+            self.model.asset_names.discard(str(asset.name))
+            identity = self.identityOf.pop(id(asset))
+            del self.identities[identity]
+        self.model.assets = [asset for asset in self.model.assets if id(asset) not in assetIds]
+        return orphans
+
+    #Undo the entry point compromises and remove the attackers from the graph so attach_attackers starts
+    #over (AttackGraph.remove_attacker skips nodes while it iterates over the reached attack steps)
+    def _detach_attackers(self):
+        for attacker in self.attack_graph.attackers:
+            for ag_node in attacker.reached_attack_steps:
+                ag_node.compromised_by = [compromiser for compromiser in ag_node.compromised_by
+                                          if compromiser is not attacker]
+        self.attack_graph.attackers = []
+        self.attack_graph._id_to_attacker = {}
+        self.attack_graph.next_attacker_id = 0
+
+    #Point the attackers of the model to the entry points of the new revision
+    def _update_attackers(self, newModel, newIdentityOf):
+        for attacker, newAttacker in zip(self.model.attackers, newModel.attackers):
+            attacker.entry_points = [(self.identities[newIdentityOf[id(asset)]], list(attackSteps))
+                                     for asset, attackSteps in newAttacker.entry_points]
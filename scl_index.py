@@ -0,0 +1,77 @@
+import xml.etree.ElementTree as ET
+
+#The SCL namespace used by all elements of an SCD file
+SCL_NS = '{http://www.iec.ch/61850/2003/SCL}'
+
+#Element types used by the parser, everything else is only walked through
+INDEXED_TAGS = frozenset(SCL_NS + tag for tag in (
+    'SubNetwork', 'ConnectedAP',
+    'Substation', 'PowerTransformer', 'VoltageLevel', 'Bay', 'ConductingEquipment', 'LNode',
+    'IED', 'AccessPoint', 'LDevice', 'LN'))
+
+#Subtrees that never contain indexed elements and are not walked
+SKIPPED_TAGS = frozenset(SCL_NS + tag for tag in (
+    'Header', 'Private', 'DataTypeTemplates', 'LN', 'LN0', 'DataSet', 'DOI'))
+
+#Index of the SCL elements in a document (or a section of it) built in a single pass.
+#Elements are kept in document order and can be looked up
+# - by element type:                    index.elements('IED')
+# - as direct children of an element:  index.children(bayTree, 'LNode')
+# - anywhere below an element:         index.descendants(iedTree, 'LDevice')
+#so that each section only visits its own part of the hierarchy,
+#substation -> VoltageLevel -> Bay -> ConductingEquipment and IED -> AccessPoint -> LDevice -> LN.
+class SclIndex:
+    def __init__(self, root):
+        self._elements = {}
+        self._children = {}
+        self._descendants = {}
+        if root.tag in INDEXED_TAGS:
+            self._elements[root.tag] = [root]
+            self._walk(root, [root])
+        else:
+            self._walk(root, [])
+
+    def _walk(self, parent, ancestors):
+        for elem in parent:
+            tag = elem.tag
+            if tag in INDEXED_TAGS:
+                self._elements.setdefault(tag, []).append(elem)
+                if ancestors and ancestors[-1] is parent:
+                    self._children.setdefault((parent, tag), []).append(elem)
+                for ancestor in ancestors:
+                    self._descendants.setdefault((ancestor, tag), []).append(elem)
+                if tag not in SKIPPED_TAGS:
+                    ancestors.append(elem)
+                    self._walk(elem, ancestors)
+                    ancestors.pop()
+            elif tag not in SKIPPED_TAGS:
+                self._walk(elem, ancestors)
+
+    def elements(self, tag):
+        return self._elements.get(SCL_NS + tag, [])
+
+    def children(self, elem, tag):
+        return self._children.get((elem, SCL_NS + tag), [])
+
+    def descendants(self, elem, tag):
+        return self._descendants.get((elem, SCL_NS + tag), [])
+
+
+#Stream an SCD file and yield each top level section (a direct child of the SCL root, e.g. a Substation,
+#the Communication section or an IED) once it has been read completely. A section is cleared and
+#removed from the root when the next one is requested, so only one section is in memory at a time.
+def scd_sections(scdFile):
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(scdFile, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        yield elem
+        elem.clear()
+        root.remove(elem)
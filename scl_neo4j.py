@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+try:
+    import neo4j
+except ImportError:
+    #Only needed to connect to a Neo4j server, the ingestion also runs against RecordingDriver
+    neo4j = None
+
+from scl_incremental import DUPLICATE_NAME_SUFFIX, association_identity, asset_identities
+
+logger = logging.getLogger(__name__)
+
+#Rows per transaction and number of transactions written at the same time
+BATCH_SIZE = 1000
+WRITERS = 4
+
+#Every node and relationship written by the ingestion has a key, the namespace of its model (e.g. the
+#substation) followed by the SCD element identity of the asset (see scl_incremental.asset_identities),
+#and a signature of its properties. Upserts MERGE on the key and only set the properties of the
+#rows whose signature changed.
+SCHEMA = (
+    'CREATE CONSTRAINT scl_asset_key IF NOT EXISTS FOR (a:SclAsset) REQUIRE a.key IS UNIQUE',
+    'CREATE CONSTRAINT scl_step_key IF NOT EXISTS FOR (s:SclAttackStep) REQUIRE s.key IS UNIQUE',
+    'CREATE INDEX scl_association_key IF NOT EXISTS FOR ()-[r:SCL_ASSOCIATION]-() ON (r.key)',
+    'CREATE INDEX scl_edge_key IF NOT EXISTS FOR ()-[r:LEADS_TO]-() ON (r.key)',
+)
+
+UPSERT_ASSETS = '''UNWIND $rows AS row
+MERGE (a:SclAsset {key: row.key})
+WITH a, row WHERE a.sig IS NULL OR a.sig <> row.sig
+SET a += row.props, a.sig = row.sig'''
+
+UPSERT_ASSOCIATIONS = '''UNWIND $rows AS row
+MATCH (left:SclAsset {key: row.left}), (right:SclAsset {key: row.right})
+MERGE (left)-[r:SCL_ASSOCIATION {key: row.key}]->(right)
+WITH r, row WHERE r.sig IS NULL OR r.sig <> row.sig
+SET r += row.props, r.sig = row.sig'''
+
+UPSERT_STEPS = '''UNWIND $rows AS row
+MERGE (s:SclAttackStep {key: row.key})
+WITH s, row WHERE s.sig IS NULL OR s.sig <> row.sig
+SET s += row.props, s.sig = row.sig
+WITH s, row MATCH (a:SclAsset {key: row.asset})
+MERGE (s)-[:STEP_OF]->(a)'''
+
+UPSERT_EDGES = '''UNWIND $rows AS row
+MATCH (parent:SclAttackStep {key: row.parent}), (child:SclAttackStep {key: row.child})
+MERGE (parent)-[r:LEADS_TO {key: row.key}]->(child)
+SET r.sig = row.sig'''
+
+DELETE_ASSETS = 'UNWIND $keys AS key MATCH (a:SclAsset {key: key}) DETACH DELETE a'
+DELETE_ASSOCIATIONS = 'UNWIND $keys AS key MATCH ()-[r:SCL_ASSOCIATION {key: key}]->() DELETE r'
+DELETE_STEPS = 'UNWIND $keys AS key MATCH (s:SclAttackStep {key: key}) DETACH DELETE s'
+DELETE_EDGES = 'UNWIND $keys AS key MATCH ()-[r:LEADS_TO {key: key}]->() DELETE r'
+
+#The kinds of rows of an ingestion, in the order they are written
+KINDS = ('assets', 'associations', 'steps', 'edges')
+
+#Open a driver with a pool of connections, one per writer is enough
+def connect(uri, username, password, pool_size=WRITERS):
+    if neo4j is None:
+        raise ImportError('The neo4j package is needed to connect to a Neo4j server (pip install neo4j)')
+    return neo4j.AsyncGraphDatabase.driver(uri, auth=(username, password), max_connection_pool_size=pool_size)
+
+def _signature(props):
+    return hashlib.sha1(json.dumps(props, sort_keys=True, default=str).encode()).hexdigest()
+
+def _key(namespace, identity):
+    return namespace + '|' + json.dumps(identity, separators=(',', ':'))
+
+#The rows of a model, and of its attack graph when given, as {kind: {key: row}}. Asset ids and the
+#duplicate suffixes of asset names are left out of the properties, they shift when assets are added
+#before them and are not an identity.
+def model_rows(namespace, model, units, attack_graph=None):
+    identities = asset_identities(model, units)
+    keyOf = {id(asset): _key(namespace, identity) for identity, asset in identities.items()}
+    rows = {kind: {} for kind in KINDS}
+    for asset in model.assets:
+        key = keyOf[id(asset)]
+        props = {'namespace': namespace, 'name': DUPLICATE_NAME_SUFFIX.sub('', str(asset.name)), 'type': str(asset.type)}
+        rows['assets'][key] = {'key': key, 'props': props, 'sig': _signature(props)}
+
+    identityOf = {id(asset): identity for identity, asset in identities.items()}
+    for association in model.associations:
+        leftField, rightField = model.get_association_field_names(association)
+        key = _key(namespace, association_identity(model, association, identityOf))
+        props = {'namespace': namespace, 'type': association.__class__.__name__,
+                 'left_field': leftField, 'right_field': rightField}
+        for left in getattr(association, leftField):
+            for right in getattr(association, rightField):
+                rowKey = key if len(getattr(association, leftField)) == len(getattr(association, rightField)) == 1 \
+                    else key + '|' + keyOf[id(left)] + '|' + keyOf[id(right)]
+                rows['associations'][rowKey] = {'key': rowKey, 'left': keyOf[id(left)], 'right': keyOf[id(right)],
+                                                'props': props, 'sig': _signature(props)}
+
+    if attack_graph is not None:
+        stepKeys = {}
+        for ag_node in attack_graph.nodes:
+            assetKey = keyOf[id(ag_node.asset)]
+            key = stepKeys[ag_node.id] = assetKey + '|' + ag_node.name
+            props = {'namespace': namespace, 'name': ag_node.name,
+                     'full_name': DUPLICATE_NAME_SUFFIX.sub('', str(ag_node.asset.name)) + ':' + ag_node.name,
+                     'type': ag_node.type, 'ttc': json.dumps(ag_node.ttc, default=str),
+                     'is_viable': bool(ag_node.is_viable), 'is_necessary': bool(ag_node.is_necessary),
+                     'defense_status': ag_node.defense_status, 'existence_status': ag_node.existence_status}
+            rows['steps'][key] = {'key': key, 'asset': assetKey, 'props': props, 'sig': _signature(props)}
+        for ag_node in attack_graph.nodes:
+            for child in ag_node.children:
+                key = stepKeys[ag_node.id] + '>' + stepKeys[child.id]
+                rows['edges'][key] = {'key': key, 'parent': stepKeys[ag_node.id], 'child': stepKeys[child.id], 'sig': ''}
+    return rows
+
+#The state of an ingestion is the signature of every row written, {kind: {key: signature}}. Given the
+#state of the previous ingestion of the same namespace, only the new and changed rows are written and
+#the rows that are gone are deleted. Without it every row is upserted and nothing is deleted.
+def load_state(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+#Writes models to Neo4j in batched transactions. Up to writers transactions run at the same time on
+#the connection pool of the driver, the assets are written before the associations and attack steps
+#and those before the attack step edges. execute_write retries the transactions that fail with a
+#transient error, such as a deadlock between two writers merging relationships of the same nodes.
+class ModelIngestor:
+    def __init__(self, driver, database=None, batch_size=BATCH_SIZE, writers=WRITERS):
+        self.driver = driver
+        self.database = database
+        self.batch_size = batch_size
+        self.writers = writers
+        self.schemaCreated = False
+
+    async def _write(self, query, parameters):
+        async with self.driver.session(database=self.database) as session:
+            await session.execute_write(_run, query, parameters)
+
+    #Run the query once per batch of items, with writers batches in flight
+    async def write_batches(self, query, name, items):
+        batches = asyncio.Queue()
+        for start in range(0, len(items), self.batch_size):
+            batches.put_nowait(items[start:start + self.batch_size])
+
+        async def writer():
+            while not batches.empty():
+                await self._write(query, {name: batches.get_nowait()})
+
+        await asyncio.gather(*(writer() for _ in range(min(self.writers, batches.qsize()))))
+
+    async def create_schema(self):
+        if not self.schemaCreated:
+            for query in SCHEMA:
+                await self._write(query, {})
+            self.schemaCreated = True
+
+    #Upsert the model (and attack graph) of namespace and return the new state (see load_state)
+    async def ingest(self, namespace, model, units, attack_graph=None, state=None):
+        await self.create_schema()
+        rows = model_rows(namespace, model, units, attack_graph)
+        previous = state if state is not None else {}
+        #Relationships first, a deleted asset takes its remaining relationships with it
+        for kind, query in (('edges', DELETE_EDGES), ('associations', DELETE_ASSOCIATIONS),
+                            ('steps', DELETE_STEPS), ('assets', DELETE_ASSETS)):
+            removed = [key for key in previous.get(kind, ()) if key not in rows[kind]]
+            await self.write_batches(query, 'keys', removed)
+
+        changed = {kind: [row for key, row in rows[kind].items() if previous.get(kind, {}).get(key) != row['sig']]
+                   for kind in KINDS}
+        await self.write_batches(UPSERT_ASSETS, 'rows', changed['assets'])
+        await asyncio.gather(self.write_batches(UPSERT_ASSOCIATIONS, 'rows', changed['associations']),
+                             self.write_batches(UPSERT_STEPS, 'rows', changed['steps']))
+        await self.write_batches(UPSERT_EDGES, 'rows', changed['edges'])
+        logger.info('Ingested %s: %s', namespace, ', '.join('%d/%d %s' % (len(changed[kind]), len(rows[kind]), kind)
+                                                              for kind in KINDS if rows[kind]))
+        return {kind: {key: row['sig'] for key, row in rows[kind].items()} for kind in KINDS}
+
+async def _run(tx, query, parameters):
+    result = await tx.run(query, parameters)
+    await result.consume()
+
+#Ingest a parsed model from synchronous code, e.g. after run_pipeline:
+#    state = ingest(scl_neo4j.connect(uri, username, password), 'substation1', instance_model, parser.units, attack_graph)
+#The driver is closed when the ingestion ends, even if it fails: its connections belong to the event loop
+#of this call and can not be used after it, so pass a new driver to each call. To ingest several models
+#with one driver, await ModelIngestor.ingest from your own event loop and close the driver yourself.
+def ingest(driver, namespace, model, units, attack_graph=None, state=None, database=None,
+           batch_size=BATCH_SIZE, writers=WRITERS):
+    async def run():
+        try:
+            return await ModelIngestor(driver, database, batch_size, writers).ingest(
+                namespace, model, units, attack_graph, state)
+        finally:
+            await driver.close()
+    return asyncio.run(run())
+
+#------------------Local stand-in-----------------
+#Stands in for the async Neo4j driver in process. Every transaction is recorded in batches as
+#(query, parameters) in the order it was committed, nothing is evaluated.
+class RecordingDriver:
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def session(self, database=None):
+        return _RecordingSession(self)
+
+    async def close(self):
+        self.closed = True
+
+    #The rows written by the recorded transactions of a query
+    def rows(self, query):
+        return [row for batchQuery, parameters in self.batches if batchQuery == query
+                for row in parameters.get('rows', parameters.get('keys', ()))]
+
+class _RecordingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_write(self, work, *args, **kwargs):
+        tx = _RecordingTransaction()
+        result = await work(tx, *args, **kwargs)
+        self.driver.batches.extend(tx.queries)
+        return result
+
+class _RecordingTransaction:
+    def __init__(self):
+        self.queries = []
+
+    async def run(self, query, parameters=None, **kwargs):
+        self.queries.append((query, dict(parameters or {}, **kwargs)))
+        return _RecordingResult()
+
+class _RecordingResult:
+    async def consume(self):
+        return None
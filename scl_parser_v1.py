@@ -1,7 +1,11 @@
+import copy
 import logging
 import xml.etree.ElementTree as ET
 import json
 import time
+import os
+import pickle
+import sys
 
 import maltoolbox
 from maltoolbox.language import classes_factory
@@ -10,378 +14,515 @@ from maltoolbox import model as malmodel
 from maltoolbox.ingestors import neo4j
 from maltoolbox.language import LanguageGraph, LanguageClassesFactory
 from maltoolbox.model import Model, AttackerAttachment
-from maltoolbox.attackgraph.analyzers import apriori
 from maltoolbox.wrappers import create_attack_graph
 from maltoolbox.attackgraph import AttackGraph, query
 
+from scl_apriori import calculate_viability_and_necessity
+from scl_cache import OUTPUT_FORMATS, QUERY_INDEX_FILE, OutputCache, file_hash, output_files
+from scl_columnar import save_attack_graph, save_model
+from scl_index import SCL_NS, SclIndex, scd_sections
+from scl_profile import Profiler
+from scl_query import save_query_index
+from scl_tables import ModelTables
+
 logger = logging.getLogger(__name__)
 
 #------------------LANGUAGE FILES-----------------
-#The sasLang language file
-lang_file = 'sasLang'
-lang_graph = LanguageGraph.from_mar_archive(lang_file) 
-lang_classes_factory = LanguageClassesFactory(lang_graph)
-
-#Creating an empty instance model
-instance_model = Model('SAS Example Model', lang_classes_factory)
-
-#------------------SCD FILES------------------
-#Update the scd file below
-tree = ET.parse('your_scd_file.scd')
-root = tree.getroot()
-
-#Create dictionary of IEDHardwares
-IEDHardwares = {}
-#Create dictionary of IED OS
-IEDOS = {}
-#Create dictionary of LDs
-LDs = {}
-#Create dictionary of Servers
-Servers = {}
-#Create dictionary of APs
-APs = {}
-
-#------------------Communication section of the SCD file-----------------
-for subNetwork in root.iter('{http://www.iec.ch/61850/2003/SCL}SubNetwork'):
-    subNetAsset = lang_classes_factory.ns.SubNetwork(name = subNetwork.attrib['name'])
-    instance_model.add_asset(subNetAsset)
-    for accessPoint in subNetwork.iter('{http://www.iec.ch/61850/2003/SCL}ConnectedAP'):
-        #Create and add assets to the model
-        aPAsset = lang_classes_factory.ns.AccessPoint(name = accessPoint.attrib['apName'])
-        instance_model.add_asset(aPAsset)
-        APs[accessPoint.attrib['apName']] = aPAsset
-        instance_model.add_asset(subNetAsset)
-        #The IED has not been created already
-        if (not (accessPoint.attrib['iedName'] in IEDHardwares)):
-            iedAsset = lang_classes_factory.ns.IEDHardware(name = accessPoint.attrib['iedName'])
-            instance_model.add_asset(iedAsset)
-            iedOSAppAsset = lang_classes_factory.ns.IcsApplication(name = accessPoint.attrib['iedName']+" OS")
-            instance_model.add_asset(iedOSAppAsset)
-            #Adding IED to IEDOS
-            ied_iedOS_assoc = lang_classes_factory.ns.SysExecution(
-            hostHardware = [iedAsset], sysExecutedApps = [iedOSAppAsset])
-            instance_model.add_association(ied_iedOS_assoc)
-        #THe IED was already created (It communicates on multiple APs)
-        else:
-            #Pick out the already created assets
-            iedAsset = IEDHardwares[accessPoint.attrib['iedName']]
-            iedOSAppAsset = IEDOS[accessPoint.attrib['iedName']]
-
-        #Create associations between assets
-        ap_iedOS_assoc = lang_classes_factory.ns.ApplicationConnection(
-            appConnections = [aPAsset], applications = [iedOSAppAsset])
-        subnet_ap_assoc = lang_classes_factory.ns.NetworkConnection(
-            networks = [subNetAsset], netConnections = [aPAsset])
-        
-        #Add the associations to the model
-        instance_model.add_association(ap_iedOS_assoc)
-        instance_model.add_association(subnet_ap_assoc)
-        
-        #create a dictionary of the IED Hardware with string, we can use these to create 
-        #IED Hardware to connect to the LDs
-        IEDHardwares[accessPoint.attrib['iedName']] = iedAsset
-        #IED OS dictionnary
-        IEDOS[accessPoint.attrib['iedName']] = iedOSAppAsset
-#----------------------------------------------------------------------------
-
-#------------------Substation section of the SCD file-----------------
-for substatTree in root.iter('{http://www.iec.ch/61850/2003/SCL}Substation'):
-    #Create and add substations to the model
-    substatAsset = lang_classes_factory.ns.Substation(name = substatTree.attrib['name'])
-    instance_model.add_asset(substatAsset)
-    #Finds PowerTransformers on substation and bay level
-    for ptIter in substatTree.iter('{http://www.iec.ch/61850/2003/SCL}PowerTransformer'):
-        ptAsset = lang_classes_factory.ns.Transformer(name = ptIter.attrib['name'])
-        instance_model.add_asset(ptAsset)
-        #add transformer to substation association
-        trans_substat_assoc = lang_classes_factory.ns.SubstatIncludesEq(
-        substation = [substatAsset], equipment = [ptAsset])  
-        instance_model.add_association(trans_substat_assoc)
-    #Create all LNs that exist on substation level (For HMI etc)
-    for lnFindAll in substatTree.findall('{http://www.iec.ch/61850/2003/SCL}LNode'):  
-        #LLN0 does not have an lnInst, in this case we set the value as "0"  
-        if (lnFindAll.attrib['lnClass'] == "LLN0"):
-            lnInstance = "0"
+#Compiled language graphs are cached in this directory, keyed by the hash of the .mar archive
+#and the maltoolbox version. Set to None to always compile the language from the archive.
+LANG_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'scl_parser')
+
+#Part of the key of the output cache, bump it when a parser change changes the generated outputs
+PARSER_VERSION = 2
+
+#The language graph is a deeply linked structure, pickling it needs a higher recursion limit
+PICKLE_RECURSION_LIMIT = 20000
+
+#Load the LanguageGraph of a .mar archive, reusing the cached compiled graph when the archive
+#has been loaded before. The cache file is written atomically so parallel workers can share it.
+def load_lang_graph(lang_file, cache_dir=LANG_CACHE_DIR):
+    if cache_dir is None:
+        return LanguageGraph.from_mar_archive(lang_file)
+    cacheFile = os.path.join(cache_dir, 'langgraph_%s_%s.pickle' % (maltoolbox.__version__, file_hash(lang_file)))
+    recursionLimit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursionLimit, PICKLE_RECURSION_LIMIT))
+    try:
+        if os.path.exists(cacheFile):
+            try:
+                with open(cacheFile, 'rb') as f:
+                    logger.info('Loading cached language graph %s', cacheFile)
+                    return pickle.load(f)
+            except Exception as e:
+                logger.warning('Could not load the cached language graph %s (%s), recompiling', cacheFile, e)
+        lang_graph = LanguageGraph.from_mar_archive(lang_file)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmpFile = '%s.%d.tmp' % (cacheFile, os.getpid())
+            with open(tmpFile, 'wb') as f:
+                pickle.dump(lang_graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpFile, cacheFile)
+        except OSError as e:
+            logger.warning('Could not write the language graph cache %s (%s)', cacheFile, e)
+        return lang_graph
+    finally:
+        sys.setrecursionlimit(recursionLimit)
+
+#------------------PARSER-----------------
+#Converts SCD files into sasLang instance models. The language graph and the classes factory are
+#created once with the parser and reused by every call to parse, so one parser can convert any
+#number of SCD files in the same process.
+class SclParser:
+    def __init__(self, lang_file='sasLang', cache_dir=LANG_CACHE_DIR, model_name='SAS Example Model'):
+        self.lang_file = lang_file
+        self.lang_graph = load_lang_graph(lang_file, cache_dir)
+        self.lang_classes_factory = LanguageClassesFactory(self.lang_graph)
+        self.model_name = model_name
+
+    #Parse an SCD file into a new instance model with an attacker on the last subnet.
+    #streaming reads the file with iterparse, otherwise the whole document is loaded with ET.parse.
+    #The time spent reading the XML and in each section is recorded in profiler (see scl_profile).
+    def parse(self, scdFile, streaming=True, profiler=None):
+        #Creating an empty instance model, the sections add their assets and associations to the
+        #tables, which commit them to the model in bulk at the end of each section
+        self.instance_model = Model(self.model_name, self.lang_classes_factory)
+        self.tables = ModelTables(self.instance_model)
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.profiler.model = self.instance_model
+        #The dictionaries below map names to asset handles of the tables (see scl_tables)
+        #Create dictionary of IEDHardwares
+        self.IEDHardwares = {}
+        #Create dictionary of IED OS
+        self.IEDOS = {}
+        #Create dictionary of LDs
+        self.LDs = {}
+        #Create dictionary of Servers
+        self.Servers = {}
+        #Create dictionary of APs
+        self.APs = {}
+        #The last subnet, AP and ConnectedAP of the Communication section are used by the later sections
+        self.subNetAsset = None
+        self.aPAsset = None
+        self.accessPoint = None
+        #The SCL elements (units) the assets and associations of the model were created from
+        self.units = []
+
+        if streaming:
+            self.stream_scd(scdFile)
         else:
-            lnInstance = lnFindAll.attrib['lnInst']
-        lnAsset = lang_classes_factory.ns.LogicalNode(name = lnFindAll.attrib['lnClass']+"_"+ lnFindAll.attrib['ldInst']+"_"+lnInstance)
-        instance_model.add_asset(lnAsset)
-        #add LN to substation association
-        ln_substat_assoc = lang_classes_factory.ns.SubstatLevelLN(
-        substation = [substatAsset], logicalNode = [lnAsset])  
-        instance_model.add_association(ln_substat_assoc)
-        #Create a dictionary of LogicalDevices to avoid duplicates. Multiple LNs can exist in the same LD. 
-        if (lnFindAll.attrib['iedName']+ "_"+lnFindAll.attrib['ldInst'] in LDs):
-            #Add association between LN and LD
-            #dont add the LD again but find it and associate to it.
-            ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-            hostApp = [LDs[lnFindAll.attrib['iedName']+ "_"+lnFindAll.attrib['ldInst']]], appExecutedApps = [lnAsset])
-            instance_model.add_association(ln_ld_assoc)
-        else:     
+            self.parse_scd(scdFile)
+
+        #Add the attacker to the model
+        subNetAsset = self.tables.asset(self.subNetAsset) if self.subNetAsset is not None else None
+        attacker = AttackerAttachment()
+        self.instance_model.add_attacker(attacker)
+        #Give an entry point
+        attacker.entry_points = [(subNetAsset, ['accessUninspected'])]
+        attacker.add_entry_point(subNetAsset, 'accessUninspected')
+        return self.instance_model
+
+    #Record that the assets and associations added from now on are created from the SCL element with this key.
+    #units holds (key, first asset index, first association index) in the order the elements were added.
+    def mark_unit(self, key):
+        self.units.append((key, self.tables.asset_count(), self.tables.association_count()))
+
+    #------------------Communication section of the SCD file-----------------
+    def add_subnetwork(self, subNetwork, index):
+        tables = self.tables
+        IEDHardwares, IEDOS, APs = self.IEDHardwares, self.IEDOS, self.APs
+        aPAsset, accessPoint = self.aPAsset, self.accessPoint
+
+        subNetName = subNetwork.attrib['name']
+        self.mark_unit(('SubNetwork', subNetName))
+        subNetAsset = tables.add_asset('SubNetwork', subNetName)
+        for accessPoint in index.descendants(subNetwork, 'ConnectedAP'):
+            iedName, apName = accessPoint.attrib['iedName'], accessPoint.attrib['apName']
+            self.mark_unit(('ConnectedAP', subNetName, iedName, apName))
+            #Create and add assets to the model
+            aPAsset = tables.add_asset('AccessPoint', apName)
+            APs[apName] = aPAsset
+            #The IED has not been created already
+            if (not (iedName in IEDHardwares)):
+                iedAsset = tables.add_asset('IEDHardware', iedName)
+                iedOSAppAsset = tables.add_asset('IcsApplication', iedName+" OS")
+                #Adding IED to IEDOS
+                tables.add_association('SysExecution', hostHardware = iedAsset, sysExecutedApps = iedOSAppAsset)
+            #THe IED was already created (It communicates on multiple APs)
+            else:
+                #Pick out the already created assets
+                iedAsset = IEDHardwares[iedName]
+                iedOSAppAsset = IEDOS[iedName]
+
+            #Create associations between assets
+            tables.add_association('ApplicationConnection', appConnections = aPAsset, applications = iedOSAppAsset)
+            tables.add_association('NetworkConnection', networks = subNetAsset, netConnections = aPAsset)
+
+            #create a dictionary of the IED Hardware with string, we can use these to create
+            #IED Hardware to connect to the LDs
+            IEDHardwares[iedName] = iedAsset
+            #IED OS dictionnary
+            IEDOS[iedName] = iedOSAppAsset
+        tables.commit()
+        self.subNetAsset, self.aPAsset, self.accessPoint = subNetAsset, aPAsset, accessPoint
+    #----------------------------------------------------------------------------
+
+    #------------------Substation section of the SCD file-----------------
+    #The LD of an LNode, created on first use
+    def lnode_ld(self, iedName, ldInst):
+        ldName = iedName+ "_"+ldInst
+        ldAsset = self.LDs.get(ldName)
+        if ldAsset is None:
             #Create the LD asset and add it to the dictionnary
-            ldAsset = lang_classes_factory.ns.LogicalDevice(name = (lnFindAll.attrib['iedName']+ "_"+lnFindAll.attrib['ldInst']))
-            instance_model.add_asset(ldAsset)
-            LDs[(lnFindAll.attrib['iedName']+ "_"+lnFindAll.attrib['ldInst'])] = ldAsset
-            #Add association between LN and LD
-            ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-                hostApp = [ldAsset], appExecutedApps = [lnAsset])
-            instance_model.add_association(ln_ld_assoc)
-
-    #Voltagelevels
-    for vlTree in root.iter('{http://www.iec.ch/61850/2003/SCL}VoltageLevel'):
-        #Create the Voltage Level asset and add it to the model
-        vlAsset = lang_classes_factory.ns.VoltageLevel(name = vlTree.attrib['name'])
-        instance_model.add_asset(vlAsset)
-
-        #Connect all voltage levels to the substation
-        vl_substat_assoc = lang_classes_factory.ns.SubstatIncludesVL(
-            voltageLevel = [vlAsset], substation = [substatAsset])  
-        instance_model.add_association(vl_substat_assoc)
-
-        #Bay
-        for bayTree in vlTree.iter('{http://www.iec.ch/61850/2003/SCL}Bay'):
-            #Create the bay and add it to the model
-            bayAsset = lang_classes_factory.ns.Bay(name = bayTree.attrib['name'])
-            instance_model.add_asset(bayAsset)
-
-            #Connect all bays to voltagelevels
-            bay_vl_assoc = lang_classes_factory.ns.VLIncludesBay(
-                bay = [bayAsset], voltageLevel = [vlAsset])
-            instance_model.add_association(bay_vl_assoc)
-
-            #--------All LNodes on bay level-----------
-            for lnIter in bayTree.findall('{http://www.iec.ch/61850/2003/SCL}LNode'):
-                #LLN0 does not have an lnInst, in this case we set the value as "0"  
-                if (lnIter.attrib['lnClass'] == "LLN0"):
-                    lnInstance = "0"
-                else:
-                    lnInstance = lnIter.attrib['lnInst']
-                lnAsset = lang_classes_factory.ns.LogicalNode(name = lnIter.attrib['lnClass']+"_"+lnIter.attrib['ldInst']+"_"+lnInstance)
-        
-                instance_model.add_asset(lnAsset)
-                ln_bay_assoc = lang_classes_factory.ns.BayLevelLN(
-                    logicalNode = [lnAsset], bay = [bayAsset]
-                )
-                instance_model.add_association(ln_bay_assoc)
-                #If the LD has already been created, add the assoc between LN and LD.
-                if (lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst'] in LDs):
-                    #Add association between LN and LD
-                    ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-                    hostApp = [LDs[lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst']]], appExecutedApps = [lnAsset])
-                    instance_model.add_association(ln_ld_assoc)
-                else:     
-                    #Create the LD asset and add it to the dictionnary
-                    ldAsset = lang_classes_factory.ns.LogicalDevice(name = (lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst']))
-                    instance_model.add_asset(ldAsset)
-                    LDs[(lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst'])] = ldAsset
-                    #Add association between LN and LD
-                    ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-                        hostApp = [ldAsset], appExecutedApps = [lnAsset])
-                    instance_model.add_association(ln_ld_assoc)
-                if (lnIter.attrib['iedName'] != "None"):
-                    #If the server has already been created we connect the LD to the existing server.
-                    if not ("Server_"+lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst'] in Servers):
-                        serverAsset = lang_classes_factory.ns.Server(name = "Server_"+lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst'])
-                        instance_model.add_asset(serverAsset)
-                        Servers["Server_"+lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst']] = serverAsset
-                        #Connect the server to the IED
-                        #We already have a list of IEDHardwares created in the Subnetwork section, so we pick it out
-                        serv_iedHardware_assoc = lang_classes_factory.ns.SysExecution(
-                        sysExecutedApps = [serverAsset], hostHardware = [IEDHardwares[lnIter.attrib['iedName']]])
-                        #Connect the Server to the LD
-                        ld_serv_assoc = lang_classes_factory.ns.AppExecution(
-                        hostApp = [LDs[lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst']]], appExecutedApps = [serverAsset]) 
-                        #Connect the LN to the newly created LD (server)
-                        #ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-                        #hostApp = [LDs[lnIter.attrib['iedName']+ "_"+lnIter.attrib['ldInst']]], appExecutedApps = [lnAsset])
-                        #instance_model.add_association(ln_ld_assoc)
-                        instance_model.add_association(serv_iedHardware_assoc)
-                        instance_model.add_association(ld_serv_assoc)
-
-            #-----------------------------------------
-            #All conducting equipment for each bay
-            for conEq in bayTree.iter('{http://www.iec.ch/61850/2003/SCL}ConductingEquipment'):
-                #---------------Circuit breaker-------------------
-                if conEq.attrib['type'] == "CBR":
-                    #print("   circuitBreaker: " + conEq.attrib['name'])
-                    eqAsset = lang_classes_factory.ns.CircuitBreaker(name = conEq.attrib['name'])
-                    #Add the equipment to the model
-                    instance_model.add_asset(eqAsset)
-                    #For Circuit breakers, add a ActuatorCB
-                    actCBAsset = lang_classes_factory.ns.ActuatorCB(name = 'CB Actuator')
-                    instance_model.add_asset(actCBAsset)
-                    act_cb_assoc = lang_classes_factory.ns.CloseOrTrip(
-                    actuatorCB = [actCBAsset], circuitBreaker = [eqAsset])
-                    instance_model.add_association(act_cb_assoc)
-                #---------------Transformer-------------------
-                elif conEq.attrib['type'] == "VTR":
-                    print("   transformer: " + conEq.attrib['name'])
-                    eqAsset = lang_classes_factory.ns.Transformer(name = conEq.attrib['name'])
-                    #Add the equipment to the model
-                    instance_model.add_asset(eqAsset)
-                #---------------Other equipment-------------------
-                else:
-                    #print("   conductingEquipment: "+conEq.attrib['name'], conEq.attrib['type'])
-                    eqAsset = lang_classes_factory.ns.Equipment(name = conEq.attrib['name'])
-                    #Add the equipment to the model
-                    instance_model.add_asset(eqAsset)
-                #-----------------Add logical Nodes part---------------
-                #Connect equipment to Bay
-                bay_eq_assoc = lang_classes_factory.ns.BayIncludesEq(
-                    bay = [bayAsset], equipment = [eqAsset])
-                instance_model.add_association(bay_eq_assoc)
-                #add the connections of the logicalNodes
-                for lnTree in conEq.iter('{http://www.iec.ch/61850/2003/SCL}LNode'):
-                    #Equipment is represented by LogicalNodes, connect them to the LNs
-                    #Special case is Circuitbreakers, these LNs are connected to the Actuator not the Eq.
-                    if lnTree.attrib['lnClass'] == "XCBR":
-                        lnAsset = lang_classes_factory.ns.LogicalNode(name = lnTree.attrib['lnClass'] +"_"+lnTree.attrib['ldInst']+"_"+lnTree.attrib['lnInst'])
-                        instance_model.add_asset(lnAsset)
-                        startingPoint = lnAsset
-                        ln_act_assoc = lang_classes_factory.ns.ActRepresent(
-                            actuator = [actCBAsset], logicalNode = [lnAsset])
-                        instance_model.add_association(ln_act_assoc)
-                    else:                      
-                        lnAsset = lang_classes_factory.ns.LogicalNode(name = lnTree.attrib['lnClass'] +"_"+lnTree.attrib['ldInst']+"_"+lnTree.attrib['lnInst']) 
-                        instance_model.add_asset(lnAsset)
-                        ln_eq_assoc = lang_classes_factory.ns.EqRepresent(
-                            equipment = [eqAsset], logicalNode = [lnAsset])
-                        instance_model.add_association(ln_eq_assoc)
-                    #If the LD already exists
-                    if ((lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst']) in LDs):   
-                        #Dont add it again but connect the LN to LD.
-                        ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-                        hostApp = [LDs[lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst']]], appExecutedApps = [lnAsset])
-                        instance_model.add_association(ln_ld_assoc)
-                    #Else we need to create the LD
-                    else:    
-                        #Create the LD asset and connect LN+LD
-                        ldAsset = lang_classes_factory.ns.LogicalDevice(name = (lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst']))
-                        instance_model.add_asset(ldAsset)
-                        LDs[(lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst'])] = ldAsset
-                        ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-                            hostApp = [ldAsset], appExecutedApps = [lnAsset])
-                        instance_model.add_association(ln_ld_assoc)
-                        
-                    #If the logicalNode is hosted on an IED, then connect the Server to the IEDHardware (and LN to LD)
-                    if (lnTree.attrib['iedName'] != "None"):
-                        #Create a server asset but check we didnt already have it. If server exist we aready connected it to IED.
-                        if not ("Server_"+lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst'] in Servers):
-                            serverAsset = lang_classes_factory.ns.Server(name = "Server_"+lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst'])
-                            instance_model.add_asset(serverAsset)
-                            Servers["Server_"+lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst']] = serverAsset                  
-                            #Connect the server to the IED
-                            #We already have a list of IEDHardwares created in the Subnetwork section, so we pick it out
-                            serv_iedHardware_assoc = lang_classes_factory.ns.SysExecution(
-                            sysExecutedApps = [serverAsset], hostHardware = [IEDHardwares[lnTree.attrib['iedName']]])
-                            #Connect the Server to the LD
-                            ld_serv_assoc = lang_classes_factory.ns.AppExecution(
-                            hostApp = [LDs[lnTree.attrib['iedName']+ "_"+lnTree.attrib['ldInst']]], appExecutedApps = [serverAsset])  
-                            instance_model.add_association(serv_iedHardware_assoc)
-                            instance_model.add_association(ld_serv_assoc)    
+            ldAsset = self.LDs[ldName] = self.tables.add_asset('LogicalDevice', ldName)
+        return ldAsset
+
+    #The Server of an LNode hosted on an IED: created on first use and connected to the IED and the LD
+    def lnode_server(self, iedName, ldInst, ldAsset):
+        serverName = "Server_"+iedName+ "_"+ldInst
+        if not (serverName in self.Servers):
+            tables = self.tables
+            serverAsset = self.Servers[serverName] = tables.add_asset('Server', serverName)
+            #Connect the server to the IED
+            #We already have a list of IEDHardwares created in the Subnetwork section, so we pick it out
+            tables.add_association('SysExecution', sysExecutedApps = serverAsset, hostHardware = self.IEDHardwares[iedName])
+            #Connect the Server to the LD
+            tables.add_association('AppExecution', hostApp = ldAsset, appExecutedApps = serverAsset)
+
+    def add_substation(self, substatTree, index):
+        tables = self.tables
+        aPAsset = self.aPAsset
+
+        substatName = substatTree.attrib['name']
+        self.mark_unit(('Substation', substatName))
+        #Create and add substations to the model
+        substatAsset = tables.add_asset('Substation', substatName)
+        #Finds PowerTransformers on substation and bay level
+        for ptIter in index.descendants(substatTree, 'PowerTransformer'):
+            ptAsset = tables.add_asset('Transformer', ptIter.attrib['name'])
+            #add transformer to substation association
+            tables.add_association('SubstatIncludesEq', substation = substatAsset, equipment = ptAsset)
+        #Create all LNs that exist on substation level (For HMI etc)
+        for lnFindAll in index.children(substatTree, 'LNode'):
+            attrib = lnFindAll.attrib
+            #LLN0 does not have an lnInst, in this case we set the value as "0"
+            if (attrib['lnClass'] == "LLN0"):
+                lnInstance = "0"
+            else:
+                lnInstance = attrib['lnInst']
+            lnAsset = tables.add_asset('LogicalNode', attrib['lnClass']+"_"+ attrib['ldInst']+"_"+lnInstance)
+            #add LN to substation association
+            tables.add_association('SubstatLevelLN', substation = substatAsset, logicalNode = lnAsset)
+            #Multiple LNs can exist in the same LD, add the LN to the existing LD or to a new one
+            tables.add_association('AppExecution', hostApp = self.lnode_ld(attrib['iedName'], attrib['ldInst']),
+                                   appExecutedApps = lnAsset)
+
+        #Voltagelevels of this substation
+        for vlTree in index.descendants(substatTree, 'VoltageLevel'):
+            vlName = vlTree.attrib['name']
+            self.mark_unit(('VoltageLevel', substatName, vlName))
+            #Create the Voltage Level asset and add it to the model
+            vlAsset = tables.add_asset('VoltageLevel', vlName)
+
+            #Connect all voltage levels to the substation
+            tables.add_association('SubstatIncludesVL', voltageLevel = vlAsset, substation = substatAsset)
+
+            #Bay
+            for bayTree in index.descendants(vlTree, 'Bay'):
+                bayName = bayTree.attrib['name']
+                self.mark_unit(('Bay', substatName, vlName, bayName))
+                #Create the bay and add it to the model
+                bayAsset = tables.add_asset('Bay', bayName)
+
+                #Connect all bays to voltagelevels
+                tables.add_association('VLIncludesBay', bay = bayAsset, voltageLevel = vlAsset)
+
+                #--------All LNodes on bay level-----------
+                for lnIter in index.children(bayTree, 'LNode'):
+                    attrib = lnIter.attrib
+                    iedName, ldInst = attrib['iedName'], attrib['ldInst']
+                    #LLN0 does not have an lnInst, in this case we set the value as "0"
+                    if (attrib['lnClass'] == "LLN0"):
+                        lnInstance = "0"
+                    else:
+                        lnInstance = attrib['lnInst']
+                    lnAsset = tables.add_asset('LogicalNode', attrib['lnClass']+"_"+ldInst+"_"+lnInstance)
+                    tables.add_association('BayLevelLN', logicalNode = lnAsset, bay = bayAsset)
+                    #Add the association between the LN and its LD, the LD is created if needed
+                    ldAsset = self.lnode_ld(iedName, ldInst)
+                    tables.add_association('AppExecution', hostApp = ldAsset, appExecutedApps = lnAsset)
+                    if (iedName != "None"):
+                        #If the server has already been created we connect the LD to the existing server.
+                        self.lnode_server(iedName, ldInst, ldAsset)
+
+                #-----------------------------------------
+                #All conducting equipment for each bay
+                for conEq in index.descendants(bayTree, 'ConductingEquipment'):
+                    eqName = conEq.attrib['name']
+                    self.mark_unit(('ConductingEquipment', substatName, vlName, bayName, eqName))
+                    #---------------Circuit breaker-------------------
+                    if conEq.attrib['type'] == "CBR":
+                        #print("   circuitBreaker: " + conEq.attrib['name'])
+                        eqAsset = tables.add_asset('CircuitBreaker', eqName)
+                        #For Circuit breakers, add a ActuatorCB
+                        actCBAsset = tables.add_asset('ActuatorCB', 'CB Actuator')
+                        tables.add_association('CloseOrTrip', actuatorCB = actCBAsset, circuitBreaker = eqAsset)
+                    #---------------Transformer-------------------
+                    elif conEq.attrib['type'] == "VTR":
+                        logger.debug('transformer: %s', eqName)
+                        eqAsset = tables.add_asset('Transformer', eqName)
+                    #---------------Other equipment-------------------
                     else:
-                        #otherwise connect the LN to the AP directly (Client AP) and add it to the bay
-                        ln_ap_assoc = lang_classes_factory.ns.ApplicationConnection(
-                            appConnections = [aPAsset], applications = [lnAsset])
-                        instance_model.add_association(ln_ap_assoc)
-
-#------------------------------------------------------------------------------------------
-#------------------IED section of the SCD file-----------------
-#For all the IEDs in this section, create LNs
-for iedIter in root.iter('{http://www.iec.ch/61850/2003/SCL}IED'):
-    #Retrieving the correct IED OS asset
-    for iedAPfindall in iedIter.findall('{http://www.iec.ch/61850/2003/SCL}AccessPoint'):
-        #Check for the special case that an LN is connected directly to an IED without an LD.
-        #These LNs are straight under the AP without a server or LD.
-        for APLNfindall in iedAPfindall.findall('{http://www.iec.ch/61850/2003/SCL}LN'):
-            #Create the new LN
-            lnAsset = lang_classes_factory.ns.LogicalNode(name = APLNfindall.attrib['lnClass']+"_None_"+APLNfindall.attrib['inst'])
-            instance_model.add_asset(lnAsset)
-            #Associate the new LN to the previously defined IED directly.
-            #Adding LN to prev defined IED
-            ied_ln_assoc = lang_classes_factory.ns.SysExecution(
-            hostHardware = [IEDHardwares[iedIter.attrib['name']]], sysExecutedApps = [lnAsset])
-            instance_model.add_association(ied_ln_assoc)
-            #Connect LN to AP
-            if (iedAPfindall.attrib['name'] in APs):
-                ln_ap_assoc = lang_classes_factory.ns.ApplicationConnection(
-                    appConnections = [APs[iedAPfindall.attrib['name']]], applications = [lnAsset])
-                instance_model.add_association(ln_ap_assoc)
-            else: 
-                aPAsset = lang_classes_factory.ns.AccessPoint(name = iedAPfindall.attrib['name'])
-                instance_model.add_asset(aPAsset)
-                APs[accessPoint.attrib['apName']] = aPAsset
-                ln_ap_assoc = lang_classes_factory.ns.ApplicationConnection(
-                    appConnections = [aPAsset], applications = [lnAsset])
-                instance_model.add_association(ln_ap_assoc)
-    for LDeviceIter in iedIter.iter('{http://www.iec.ch/61850/2003/SCL}LDevice'):
-        #Create LD
-        ldAsset = lang_classes_factory.ns.LogicalDevice(name = (iedIter.attrib['name']+ "_"+LDeviceIter.attrib['inst']))
-        instance_model.add_asset(ldAsset)
-        #Create server
-        serverAsset = lang_classes_factory.ns.Server(name = "Server")
-        instance_model.add_asset(serverAsset)
-        #Connect LD to Server
-        ld_server_assoc = lang_classes_factory.ns.AppExecution(
-            hostApp = [serverAsset], appExecutedApps = [ldAsset])
-        instance_model.add_association(ld_server_assoc)
-        #Connect Server to IED
-        ied_server_assoc = lang_classes_factory.ns.SysExecution(
-            hostHardware = [IEDHardwares[iedIter.attrib['name']]], sysExecutedApps = [serverAsset])
-        instance_model.add_association(ied_server_assoc)
-        for LNfindAll in LDeviceIter.findall('{http://www.iec.ch/61850/2003/SCL}LN'):
-            lnAsset = lang_classes_factory.ns.LogicalNode(name = LNfindAll.attrib['lnClass']+"_"+LDeviceIter.attrib['inst']+"_"+LNfindAll.attrib['inst'])
-            instance_model.add_asset(lnAsset)
-            #Adding data packages manually
-            #if (LNfindAll.attrib['lnClass']+"_"+LDeviceIter.attrib['inst']+"_"+LNfindAll.attrib['inst'] == "CILO_LD0_1"):
-            #    EnaOpnAsset = lang_classes_factory.ns.IcsData(name = "EnaOpn")
-            #    EnaClsAsset = lang_classes_factory.ns.IcsData(name = "EnaCls")
-            #    instance_model.add_asset(EnaOpnAsset)
-            #    instance_model.add_asset(EnaClsAsset)
-            #    enaOpn_ln_assoc = lang_classes_factory.ns.SendData(sentData = [EnaOpnAsset], senderApp = [lnAsset])
-            #    instance_model.add_association(enaOpn_ln_assoc)
-            #    enaCls_ln_assoc = lang_classes_factory.ns.SendData(sentData = [EnaClsAsset], senderApp = [lnAsset])
-            #    instance_model.add_association(enaCls_ln_assoc)
-            #    data_subnet_assoc = lang_classes_factory.ns.DataInTransit(transitData = [EnaOpnAsset], transitNetwork = [subNetAsset])
-            #    instance_model.add_association(data_subnet_assoc)
-            #    enaOpn_subnet_assoc = lang_classes_factory.ns.DataInTransit(transitData = [EnaClsAsset], transitNetwork = [subNetAsset])
-            #    instance_model.add_association(enaOpn_subnet_assoc)   
-            #if ((LNfindAll.attrib['lnClass']+"_"+LDeviceIter.attrib['inst']+"_"+LNfindAll.attrib['inst'] == "PTOC_OC4_1_1")):
-            #    opAsset = lang_classes_factory.ns.IcsControlData(name = "Op")
-            #    instance_model.add_asset(opAsset)
-            #    op_ln_assoc = lang_classes_factory.ns.ReceiveData(receivedData = [opAsset], receiverApp = [lnAsset])
-            #    instance_model.add_association(op_ln_assoc)
-                #add connection to subnet
-            #    op_subnet_assoc = lang_classes_factory.ns.DataInTransit(transitData = [opAsset], transitNetwork = [subNetAsset])
-            #    instance_model.add_association(op_subnet_assoc)
-            ln_ld_assoc = lang_classes_factory.ns.AppExecution(
-            hostApp = [ldAsset], appExecutedApps = [lnAsset])
-            instance_model.add_association(ln_ld_assoc)
+                        #print("   conductingEquipment: "+conEq.attrib['name'], conEq.attrib['type'])
+                        eqAsset = tables.add_asset('Equipment', eqName)
+                    #-----------------Add logical Nodes part---------------
+                    #Connect equipment to Bay
+                    tables.add_association('BayIncludesEq', bay = bayAsset, equipment = eqAsset)
+                    #add the connections of the logicalNodes
+                    for lnTree in index.descendants(conEq, 'LNode'):
+                        attrib = lnTree.attrib
+                        iedName, ldInst = attrib['iedName'], attrib['ldInst']
+                        lnAsset = tables.add_asset('LogicalNode', attrib['lnClass'] +"_"+ldInst+"_"+attrib['lnInst'])
+                        #Equipment is represented by LogicalNodes, connect them to the LNs
+                        #Special case is Circuitbreakers, these LNs are connected to the Actuator not the Eq.
+                        if attrib['lnClass'] == "XCBR":
+                            tables.add_association('ActRepresent', actuator = actCBAsset, logicalNode = lnAsset)
+                        else:
+                            tables.add_association('EqRepresent', equipment = eqAsset, logicalNode = lnAsset)
+                        #Connect the LN to its LD, the LD is created if it does not exist yet
+                        ldAsset = self.lnode_ld(iedName, ldInst)
+                        tables.add_association('AppExecution', hostApp = ldAsset, appExecutedApps = lnAsset)
+
+                        #If the logicalNode is hosted on an IED, then connect the Server to the IEDHardware (and LN to LD)
+                        if (iedName != "None"):
+                            #Create a server asset but check we didnt already have it. If server exist we aready connected it to IED.
+                            self.lnode_server(iedName, ldInst, ldAsset)
+                        else:
+                            #otherwise connect the LN to the AP directly (Client AP) and add it to the bay
+                            tables.add_association('ApplicationConnection', appConnections = aPAsset, applications = lnAsset)
+        tables.commit()
+
+    #------------------------------------------------------------------------------------------
+    #------------------IED section of the SCD file-----------------
+    #For all the IEDs in this section, create LNs
+    def add_ied(self, iedIter, index):
+        tables = self.tables
+        IEDHardwares, APs = self.IEDHardwares, self.APs
+        accessPoint = self.accessPoint
+
+        iedName = iedIter.attrib['name']
+        self.mark_unit(('IED', iedName))
+        #Retrieving the correct IED OS asset
+        for iedAPfindall in index.children(iedIter, 'AccessPoint'):
+            #Check for the special case that an LN is connected directly to an IED without an LD.
+            #These LNs are straight under the AP without a server or LD.
+            for APLNfindall in index.children(iedAPfindall, 'LN'):
+                #Create the new LN
+                lnAsset = tables.add_asset('LogicalNode', APLNfindall.attrib['lnClass']+"_None_"+APLNfindall.attrib['inst'])
+                #Associate the new LN to the previously defined IED directly.
+                #Adding LN to prev defined IED
+                tables.add_association('SysExecution', hostHardware = IEDHardwares[iedName], sysExecutedApps = lnAsset)
+                #Connect LN to AP
+                if (iedAPfindall.attrib['name'] in APs):
+                    tables.add_association('ApplicationConnection', appConnections = APs[iedAPfindall.attrib['name']],
+                                           applications = lnAsset)
+                else:
+                    aPAsset = tables.add_asset('AccessPoint', iedAPfindall.attrib['name'])
+                    APs[accessPoint.attrib['apName']] = aPAsset
+                    tables.add_association('ApplicationConnection', appConnections = aPAsset, applications = lnAsset)
+        for LDeviceIter in index.descendants(iedIter, 'LDevice'):
+            ldInst = LDeviceIter.attrib['inst']
+            self.mark_unit(('LDevice', iedName, ldInst))
+            #Create LD
+            ldAsset = tables.add_asset('LogicalDevice', iedName+ "_"+ldInst)
+            #Create server
+            serverAsset = tables.add_asset('Server', "Server")
+            #Connect LD to Server
+            tables.add_association('AppExecution', hostApp = serverAsset, appExecutedApps = ldAsset)
+            #Connect Server to IED
+            tables.add_association('SysExecution', hostHardware = IEDHardwares[iedName], sysExecutedApps = serverAsset)
+            for LNfindAll in index.children(LDeviceIter, 'LN'):
+                lnAsset = tables.add_asset('LogicalNode', LNfindAll.attrib['lnClass']+"_"+ldInst+"_"+LNfindAll.attrib['inst'])
+                #Adding data packages manually
+                #if (LNfindAll.attrib['lnClass']+"_"+LDeviceIter.attrib['inst']+"_"+LNfindAll.attrib['inst'] == "CILO_LD0_1"):
+                #    EnaOpnAsset = lang_classes_factory.ns.IcsData(name = "EnaOpn")
+                #    EnaClsAsset = lang_classes_factory.ns.IcsData(name = "EnaCls")
+                #    instance_model.add_asset(EnaOpnAsset)
+                #    instance_model.add_asset(EnaClsAsset)
+                #    enaOpn_ln_assoc = lang_classes_factory.ns.SendData(sentData = [EnaOpnAsset], senderApp = [lnAsset])
+                #    instance_model.add_association(enaOpn_ln_assoc)
+                #    enaCls_ln_assoc = lang_classes_factory.ns.SendData(sentData = [EnaClsAsset], senderApp = [lnAsset])
+                #    instance_model.add_association(enaCls_ln_assoc)
+                #    data_subnet_assoc = lang_classes_factory.ns.DataInTransit(transitData = [EnaOpnAsset], transitNetwork = [subNetAsset])
+                #    instance_model.add_association(data_subnet_assoc)
+                #    enaOpn_subnet_assoc = lang_classes_factory.ns.DataInTransit(transitData = [EnaClsAsset], transitNetwork = [subNetAsset])
+                #    instance_model.add_association(enaOpn_subnet_assoc)
+                #if ((LNfindAll.attrib['lnClass']+"_"+LDeviceIter.attrib['inst']+"_"+LNfindAll.attrib['inst'] == "PTOC_OC4_1_1")):
+                #    opAsset = lang_classes_factory.ns.IcsControlData(name = "Op")
+                #    instance_model.add_asset(opAsset)
+                #    op_ln_assoc = lang_classes_factory.ns.ReceiveData(receivedData = [opAsset], receiverApp = [lnAsset])
+                #    instance_model.add_association(op_ln_assoc)
+                    #add connection to subnet
+                #    op_subnet_assoc = lang_classes_factory.ns.DataInTransit(transitData = [opAsset], transitNetwork = [subNetAsset])
+                #    instance_model.add_association(op_subnet_assoc)
+                tables.add_association('AppExecution', hostApp = ldAsset, appExecutedApps = lnAsset)
+        tables.commit()
+    #--------------------------------------------------------------
+
+    #------------------Reading the SCD file-----------------
+    #Load the whole document, index it once and run the sections in order: Communication, Substation, IED
+    def parse_scd(self, scdFile):
+        profiler = self.profiler
+        with profiler.stage('xml_load'):
+            tree = ET.parse(scdFile)
+            index = SclIndex(tree.getroot())
+        with profiler.stage('communication'):
+            for subNetwork in index.elements('SubNetwork'):
+                self.add_subnetwork(subNetwork, index)
+        for substatTree in index.elements('Substation'):
+            with profiler.stage('substation'):
+                self.add_substation(substatTree, index)
+        for iedIter in index.elements('IED'):
+            with profiler.stage('ied'):
+                self.add_ied(iedIter, index)
+
+    #Stream the document and add each top level section to the model as soon as it is complete.
+    #The SCL schema orders the sections Substation, Communication, IED, so the (small) Substation
+    #sections are kept until the Communication section has been added, the IEDs are added one
+    #at a time, and every processed subtree is indexed on its own and cleared to keep memory bounded.
+    #The sections are profiled as they are added, the xml_load stage is the time spent reading.
+    def stream_scd(self, scdFile):
+        with self.profiler.stage('xml_load'):
+            self._stream_scd(scdFile)
+
+    def _stream_scd(self, scdFile):
+        profiler = self.profiler
+        pendingSubstations = []
+        substationsAdded = False
+        for elem in scd_sections(scdFile):
+            if elem.tag == SCL_NS + 'Substation':
+                if substationsAdded:
+                    raise ValueError('%s section is out of the SCL section order (Substation, Communication, IED), '
+                        'use streaming = False for this SCD file' % elem.tag)
+                #Kept whole until the Communication section has been added, a copy survives the clearing
+                pendingSubstations.append(copy.copy(elem))
+                continue
+            if elem.tag == SCL_NS + 'Communication':
+                if substationsAdded:
+                    raise ValueError('%s section is out of the SCL section order (Substation, Communication, IED), '
+                        'use streaming = False for this SCD file' % elem.tag)
+                with profiler.stage('communication'):
+                    index = SclIndex(elem)
+                    for subNetwork in index.elements('SubNetwork'):
+                        self.add_subnetwork(subNetwork, index)
+            if elem.tag in (SCL_NS + 'Communication', SCL_NS + 'IED') and not substationsAdded:
+                self.add_pending_substations(pendingSubstations)
+                substationsAdded = True
+            if elem.tag == SCL_NS + 'IED':
+                with profiler.stage('ied'):
+                    self.add_ied(elem, SclIndex(elem))
+        if not substationsAdded:
+            self.add_pending_substations(pendingSubstations)
+
+    def add_pending_substations(self, pendingSubstations):
+        for substatTree in pendingSubstations:
+            with self.profiler.stage('substation'):
+                self.add_substation(substatTree, SclIndex(substatTree))
+            substatTree.clear()
+        pendingSubstations.clear()
+    #--------------------------------------------------------------
+
+
+#------------------PIPELINE-----------------
+#Parse an SCD file and write the threat model and the attack graphs before and after the apriori
+#analysis to output_dir. Returns the instance model and the attack graph with the attackers attached.
+#formats are the file formats to write, 'yml' and/or the binary columnar 'sclc' (see scl_columnar).
+#With 'sclc' the query index of the model and the attack graph is written too (see scl_query).
+#Every stage is timed in profiler, which is logged at the end (see scl_profile).
+def run_pipeline(parser, scd_file, output_dir='.', streaming=True, formats=('yml',), profiler=None):
+    for outputFormat in formats:
+        if outputFormat not in OUTPUT_FORMATS:
+            raise ValueError('Unknown output format %s, expected one of %s' % (outputFormat, ', '.join(OUTPUT_FORMATS)))
+    profiler = profiler if profiler is not None else Profiler()
+    instance_model = parser.parse(scd_file, streaming, profiler)
+    save_outputs(instance_model, os.path.join(output_dir, 'threat_model'), formats, profiler)
+
+    with profiler.stage('attack_graph'):
+        attack_graph = AttackGraph(parser.lang_graph, instance_model)
+        profiler.attack_graph = attack_graph
+    save_outputs(attack_graph, os.path.join(output_dir, 'ag'), formats, profiler)
+    with profiler.stage('apriori'):
+        calculate_viability_and_necessity(attack_graph)
+    save_outputs(attack_graph, os.path.join(output_dir, 'post_ag'), formats, profiler)
+    if 'sclc' in formats:
+        with profiler.stage('save ' + QUERY_INDEX_FILE):
+            save_query_index(instance_model, attack_graph, os.path.join(output_dir, QUERY_INDEX_FILE))
+    with profiler.stage('attach_attackers'):
+        attack_graph.attach_attackers()
+    profiler.log()
+    return instance_model, attack_graph
+
+#Save an instance model or an attack graph to basename.<format> for each format
+def save_outputs(output, basename, formats, profiler):
+    for outputFormat in formats:
+        filename = basename + '.' + outputFormat
+        with profiler.stage('save ' + os.path.basename(filename)):
+            if outputFormat == 'yml':
+                output.save_to_file(filename)
+            elif isinstance(output, AttackGraph):
+                save_attack_graph(output, filename)
+            else:
+                save_model(output, filename)
+
+#The sizes of the outputs of run_pipeline, reported by the batch converter and kept in the output cache
+def pipeline_counts(instance_model, attack_graph):
+    return {'assets': len(instance_model.assets),
+            'associations': len(instance_model.associations),
+            'attack_steps': len(attack_graph.nodes)}
 #--------------------------------------------------------------
-#Add the attacker to the model
-attacker = AttackerAttachment()
-instance_model.add_attacker(attacker)
-#Give an entry point
-attacker.entry_points = [(subNetAsset, ['accessUninspected'])]
-attacker.add_entry_point(subNetAsset, 'accessUninspected')
-instance_model.save_to_file('threat_model.yml')
-
-attack_graph = AttackGraph(lang_graph, instance_model)
-attack_graph.save_to_file('ag.yml')
-apriori.calculate_viability_and_necessity(attack_graph)
-attack_graph.save_to_file('post_ag.yml')
-attack_graph.attach_attackers()
-
-attacker = attack_graph.attackers[0]
-
-#Choose below which asset is compromised
-#attacker.compromise(attack_graph.get_node_by_id(61481))
-
-#Add the generated model to the Neo4j server
-#if maltoolbox.neo4j_configs['uri'] != "":
-#    neo4j.ingest_model(instance_model,
-#    maltoolbox.neo4j_configs['uri'],
-#    maltoolbox.neo4j_configs['username'],
-#    maltoolbox.neo4j_configs['password'],
-#    maltoolbox.neo4j_configs['dbname'],
-#    delete=True)
+
+
+if __name__ == '__main__':
+    #------------------LANGUAGE FILES-----------------
+    #The sasLang language file
+    lang_file = 'sasLang'
+
+    #------------------SCD FILES------------------
+    #Update the scd file below
+    scd_file = 'your_scd_file.scd'
+    #Stream the SCD file with iterparse so that peak memory stays bounded for large files.
+    #Set to False to load the whole document with ET.parse instead.
+    streaming = True
+    #Output file formats, add 'sclc' to also write the binary columnar files (see scl_columnar)
+    formats = ('yml',)
+    #Reuse the outputs of an SCD file that was converted before, set to None to always convert it
+    cache = OutputCache()
+    #Log the time, peak memory and model size of every stage and write them to profile.json
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s')
+    logging.getLogger('scl_profile').setLevel(logging.INFO)
+
+    cacheKey = cache.key(scd_file, lang_file, PARSER_VERSION) if cache is not None else None
+    if cache is not None and cache.get(cacheKey, '.', output_files(formats)) is not None:
+        print('Copied %s from the output cache' % ', '.join(output_files(formats)))
+    else:
+        parser = SclParser(lang_file)
+        profiler = Profiler()
+        instance_model, attack_graph = run_pipeline(parser, scd_file, '.', streaming, formats, profiler)
+        profiler.save('profile.json')
+        if cache is not None:
+            cache.put(cacheKey, '.', pipeline_counts(instance_model, attack_graph), output_files(formats))
+
+        attacker = attack_graph.attackers[0]
+
+        #Choose below which asset is compromised
+        #attacker.compromise(attack_graph.get_node_by_id(61481))
+
+        #Add the generated model to the Neo4j server, only what changed since the previous ingestion of
+        #this SCD file is written, in batched concurrent transactions (see scl_neo4j)
+        #if maltoolbox.neo4j_configs['uri'] != "":
+        #    import scl_neo4j
+        #    driver = scl_neo4j.connect(maltoolbox.neo4j_configs['uri'],
+        #    maltoolbox.neo4j_configs['username'],
+        #    maltoolbox.neo4j_configs['password'])
+        #    state = scl_neo4j.load_state('neo4j_state.json') if os.path.exists('neo4j_state.json') else None
+        #    state = scl_neo4j.ingest(driver, os.path.basename(scd_file), instance_model, parser.units,
+        #    attack_graph, state, database=maltoolbox.neo4j_configs['dbname'])
+        #    scl_neo4j.save_state(state, 'neo4j_state.json')
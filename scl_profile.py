@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    #Not available on Windows, peak RSS is not recorded there
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+#Current resident set size of the process in MB, or None where it can not be read (no /proc)
+def rss_mb():
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+#Peak resident set size of the process in MB since it started, or None where it can not be read.
+#The processes of scl_batch convert many files, so this peak can be the one of an earlier file.
+def peak_rss_mb():
+    if resource is None:
+        return None
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macOS and in KB elsewhere
+    return maxRss / 1024 ** 2 if sys.platform == 'darwin' else maxRss / 1024
+
+#Peak resident set size of the process in MB since it started or since reset_peak_rss, or None
+#where it can not be read (no /proc)
+def hwm_mb():
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+#Reset the peak resident set size of the process to its current RSS, returns False where it can
+#not be reset (clear_refs is Linux only). This also resets ru_maxrss.
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+#Records the wall time, RSS and model sizes of the stages of the pipeline.
+#Stages are timed with
+#    with profiler.stage('ied'):
+#        ...
+#and can be entered many times (e.g. once per IED), their calls and times add up. Stages can be
+#nested, the time and the added assets of a stage exclude those of the stages run inside it, so the
+#stages add up to the totals. The model and attack_graph attributes are the model and graph being
+#built, their sizes are recorded when a stage ends, together with the current RSS of the process.
+#The peak RSS of a stage is the highest peak over its calls, including the stages nested in it. On
+#Linux the peak of the process is reset when a stage starts and read when it ends, elsewhere the
+#peak of the memory traced by tracemalloc is used if it is tracing, peak_source tells which one.
+class Profiler:
+    def __init__(self):
+        self.stages = {}
+        self.model = None
+        self.attack_graph = None
+        self._nested = []
+        self._start = time.perf_counter()
+        #Resetting the peak RSS also resets the one of the process, keep the peak before the reset
+        self._processPeak = peak_rss_mb()
+        if hwm_mb() is not None and reset_peak_rss():
+            self.peak_source = 'rss'
+        elif tracemalloc.is_tracing():
+            self.peak_source = 'tracemalloc'
+        else:
+            self.peak_source = None
+
+    @contextmanager
+    def stage(self, name):
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = {'name': name, 'calls': 0, 'seconds': 0.0, 'rss_mb': None,
+                                          'peak_rss_mb': None, 'assets': 0, 'associations': 0}
+        startAssets, startAssociations = self._sizes()
+        #The peak of the enclosing stage up to now is kept before it is reset
+        if self._nested:
+            self._nested[-1][3] = _max(self._nested[-1][3], self._peak())
+        self._reset_peak()
+        #Time, assets, associations and peak of the stages nested in this one
+        self._nested.append([0.0, 0, 0, None])
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            assets, associations = self._sizes()
+            assets, associations = assets - startAssets, associations - startAssociations
+            nestedTime, nestedAssets, nestedAssociations, nestedPeak = self._nested.pop()
+            peak = _max(nestedPeak, self._peak())
+            if self._nested:
+                self._nested[-1][0] += elapsed
+                self._nested[-1][1] += assets
+                self._nested[-1][2] += associations
+                self._nested[-1][3] = _max(self._nested[-1][3], peak)
+            if self.peak_source == 'rss':
+                self._processPeak = _max(self._processPeak, peak)
+            record['calls'] += 1
+            record['seconds'] += elapsed - nestedTime
+            record['rss_mb'] = rss_mb()
+            record['peak_rss_mb'] = _max(record['peak_rss_mb'], peak)
+            #Assets and associations added by the stage, and the size of the attack graph after it
+            record['assets'] += assets - nestedAssets
+            record['associations'] += associations - nestedAssociations
+            if self.attack_graph is not None:
+                record['attack_steps'] = len(self.attack_graph.nodes)
+            logger.debug('Stage %s took %.3fs', name, elapsed - nestedTime)
+
+    #Peak since the last reset in MB
+    def _peak(self):
+        if self.peak_source == 'rss':
+            return hwm_mb()
+        if self.peak_source == 'tracemalloc' and tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        return None
+
+    def _reset_peak(self):
+        if self.peak_source == 'rss':
+            reset_peak_rss()
+        elif self.peak_source == 'tracemalloc' and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+    def _sizes(self):
+        if self.model is None:
+            return (0, 0)
+        return (len(self.model.assets), len(self.model.associations))
+
+    def to_dict(self):
+        return {
+            'seconds': time.perf_counter() - self._start,
+            'rss_mb': rss_mb(),
+            'process_peak_rss_mb': _max(self._processPeak, peak_rss_mb()),
+            'peak_source': self.peak_source,
+            'assets': self._sizes()[0],
+            'associations': self._sizes()[1],
+            'attack_steps': len(self.attack_graph.nodes) if self.attack_graph is not None else None,
+            'stages': list(self.stages.values()),
+        }
+
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    #Log one line per stage and the totals
+    def log(self, level=logging.INFO):
+        for record in self.stages.values():
+            logger.log(level, '%-24s %5d calls %9.3fs  RSS %s  peak %s  +%d assets  +%d associations',
+                       record['name'], record['calls'], record['seconds'], _format_mb(record['rss_mb']),
+                       _format_mb(record['peak_rss_mb']), record['assets'], record['associations'])
+        summary = self.to_dict()
+        logger.log(level, '%-24s %15.3fs  RSS %s  process peak RSS %s  %d assets  %d associations  %s attack steps',
+                   'total', summary['seconds'], _format_mb(summary['rss_mb']), _format_mb(summary['process_peak_rss_mb']),
+                   summary['assets'], summary['associations'], summary['attack_steps'])
+
+def _format_mb(mb):
+    return '%.1f MB' % mb if mb is not None else 'n/a'
+
+def _max(a, b):
+    if a is None:
+        return b
+    return a if b is None else max(a, b)
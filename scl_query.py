@@ -0,0 +1,288 @@
+from bisect import bisect_left
+
+from scl_columnar import ColumnarFile, _add_csr, _ColumnarWriter
+from scl_scenarios import ScenarioSweep, entry_point_scenarios
+
+#Associations that place an asset under another one in the SCL hierarchy, (parent field, child field).
+#The hierarchy is a DAG: an LN is under its Bay or equipment and under its LD, Server and IED, and an
+#IED is under the OS it runs, itself under the access points and subnets the IED communicates on.
+CONTAINMENT = {
+    'SubstatIncludesVL': ('substation', 'voltageLevel'),
+    'VLIncludesBay': ('voltageLevel', 'bay'),
+    'SubstatIncludesEq': ('substation', 'equipment'),
+    'BayIncludesEq': ('bay', 'equipment'),
+    'CloseOrTrip': ('circuitBreaker', 'actuatorCB'),
+    'SubstatLevelLN': ('substation', 'logicalNode'),
+    'BayLevelLN': ('bay', 'logicalNode'),
+    'EqRepresent': ('equipment', 'logicalNode'),
+    'ActRepresent': ('actuator', 'logicalNode'),
+    'NetworkConnection': ('networks', 'netConnections'),
+    'ApplicationConnection': ('appConnections', 'applications'),
+    'SysExecution': ('hostHardware', 'sysExecutedApps'),
+    'AppExecution': ('hostApp', 'appExecutedApps'),
+}
+
+#Asset types whose descendants in the hierarchy are precomputed
+SCOPE_TYPES = ('Substation', 'VoltageLevel', 'Bay', 'SubNetwork', 'IEDHardware', 'LogicalDevice')
+
+#------------------Building the index-----------------
+#The direct children of every asset in the hierarchy, as lists of asset rows
+def _hierarchy(model, assetRow):
+    children = [[] for _ in model.assets]
+    for association in model.associations:
+        fields = CONTAINMENT.get(association.__class__.__name__)
+        if fields is None:
+            continue
+        for parent in getattr(association, fields[0]):
+            for child in getattr(association, fields[1]):
+                #The Servers of LNodes are the executed apps of their LD (see SclParser.lnode_server),
+                #the LD is still under the Server and its IED in the hierarchy
+                if parent.type == 'LogicalDevice' and child.type == 'Server':
+                    parent, child = child, parent
+                #The IED OS runs on its IEDHardware, the IED is under the OS so that it is under the access
+                #points connected to the OS
+                if parent.type == 'IEDHardware' and child.type == 'IcsApplication':
+                    parent, child = child, parent
+                children[assetRow[id(parent)]].append(assetRow[id(child)])
+    return [sorted(set(rows)) for rows in children]
+
+def _descendants(children, row):
+    seen = set()
+    stack = list(children[row])
+    while stack:
+        child = stack.pop()
+        if child not in seen:
+            seen.add(child)
+            stack.extend(children[child])
+    return sorted(seen)
+
+def _grouped(keys):
+    groups = {}
+    for row, key in enumerate(keys):
+        groups.setdefault(key, []).append(row)
+    return groups
+
+#Save the query index of an instance model and its attack graph, after the apriori analysis, in the
+#columnar format (see scl_columnar). Assets and attack steps are rows in the order of model.assets and
+#attack_graph.nodes, the same rows as in threat_model.sclc and post_ag.sclc. The index holds:
+#  - the assets of every type and the attack steps of every step name and of every asset
+#  - the hierarchy (see CONTAINMENT), with the descendants of the SCOPE_TYPES assets precomputed
+#  - the children and parents of the attack steps
+#  - a reachability summary per entry point (see scl_scenarios): the steps reached from every
+#    subnet, access point and IED, and the critical (circuit breaker trip) steps among them
+#workers is the number of processes the reachability summaries are computed with.
+def save_query_index(instance_model, attack_graph, filename, workers=1):
+    writer = _ColumnarWriter('query_index', {})
+    strings = writer.strings
+    assets = list(instance_model.assets)
+    assetRow = {id(asset): row for row, asset in enumerate(assets)}
+    writer.add('asset_name', 'i', (strings.add(str(asset.name)) for asset in assets))
+    writer.add('asset_type', 'i', (strings.add(str(asset.type)) for asset in assets))
+    assetTypes = _grouped(str(asset.type) for asset in assets)
+    writer.add('type_name', 'i', (strings.add(assetType) for assetType in assetTypes))
+    _add_csr(writer, 'type_assets', assetTypes.values())
+
+    children = _hierarchy(instance_model, assetRow)
+    parents = [[] for _ in assets]
+    for row, rowChildren in enumerate(children):
+        for child in rowChildren:
+            parents[child].append(row)
+    _add_csr(writer, 'asset_children', children)
+    _add_csr(writer, 'asset_parents', parents)
+    scopes = [row for row, asset in enumerate(assets) if asset.type in SCOPE_TYPES]
+    writer.add('scope_asset', 'q', scopes)
+    _add_csr(writer, 'scope_assets', (_descendants(children, row) for row in scopes))
+
+    nodes = attack_graph.nodes
+    sweep = ScenarioSweep(attack_graph)
+    position = sweep.position
+    writer.add('node_asset', 'q', (assetRow.get(id(ag_node.asset), -1) for ag_node in nodes))
+    writer.add('node_name', 'i', (strings.add(ag_node.name) for ag_node in nodes))
+    stepNames = _grouped(ag_node.name for ag_node in nodes)
+    writer.add('step_name', 'i', (strings.add(stepName) for stepName in stepNames))
+    _add_csr(writer, 'step_nodes', stepNames.values())
+    assetNodes = [[] for _ in assets]
+    for row, ag_node in enumerate(nodes):
+        if id(ag_node.asset) in assetRow:
+            assetNodes[assetRow[id(ag_node.asset)]].append(row)
+    _add_csr(writer, 'asset_nodes', assetNodes)
+    _add_csr(writer, 'node_children', ((position[child.id] for child in ag_node.children) for ag_node in nodes))
+    _add_csr(writer, 'node_parents', ((position[parent.id] for parent in ag_node.parents) for ag_node in nodes))
+
+    scenarios = entry_point_scenarios(attack_graph)
+    reached = sweep.reached(scenarios, workers)
+    critical = set(sweep.critical)
+    writer.add('critical_nodes', 'q', sweep.critical)
+    writer.add('scenario_name', 'i', (strings.add(scenario.name) for scenario in scenarios))
+    _add_csr(writer, 'scenario_entries', (sweep._entries(scenario) for scenario in scenarios))
+    _add_csr(writer, 'scenario_reached', reached)
+    _add_csr(writer, 'scenario_critical', ([row for row in rows if row in critical] for rows in reached))
+    writer.write(filename)
+
+#------------------Queries-----------------
+#Answers topology and reachability questions from a query index file saved by save_query_index.
+#The file is memory mapped and the sections are used in place, only the name lookups are built
+#when the index is opened. Assets are given and returned by name and attack steps by full name
+#('asset name:attack step name').
+class QueryIndex:
+    def __init__(self, filename):
+        self.columns = columns = ColumnarFile(filename)
+        if columns.kind != 'query_index':
+            columns.close()
+            raise ValueError('%s holds a %s, not a query index' % (filename, columns.kind))
+        string = columns.string
+        self.assetNames = [string(i) for i in columns.section('asset_name')]
+        self.assetRows = {name: row for row, name in enumerate(self.assetNames)}
+        self.typeRows = {string(i): row for row, i in enumerate(columns.section('type_name'))}
+        self.stepRows = {string(i): row for row, i in enumerate(columns.section('step_name'))}
+        self.scopeRows = {self.assetNames[asset]: row for row, asset in enumerate(columns.section('scope_asset'))}
+        self.scenarioRows = {string(i): row for row, i in enumerate(columns.section('scenario_name'))}
+
+    def close(self):
+        self.columns.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    def _asset_row(self, name):
+        row = self.assetRows.get(name)
+        if row is None:
+            raise KeyError('No asset named %s in the query index' % name)
+        return row
+
+    def _scenario_row(self, entry):
+        row = self.scenarioRows.get(entry)
+        if row is None:
+            raise KeyError('No reachability summary for entry point %s in the query index' % entry)
+        return row
+
+    def full_name(self, node):
+        asset = self.columns.section('node_asset')[node]
+        stepName = self.columns.string(self.columns.section('node_name')[node])
+        return (self.assetNames[asset] if asset != -1 else '') + ':' + stepName
+
+    def _full_names(self, nodes):
+        return [self.full_name(node) for node in nodes]
+
+    #The row of an attack step in attack_graph.nodes (and post_ag.sclc), None if there is no such step
+    def node(self, fullName):
+        assetName, _, stepName = fullName.rpartition(':')
+        row = self.assetRows.get(assetName)
+        if row is None:
+            return None
+        nodeNames = self.columns.section('node_name')
+        for node in self.columns.row('asset_nodes', row):
+            if self.columns.string(nodeNames[node]) == stepName:
+                return node
+        return None
+
+    def _node(self, fullName):
+        node = self.node(fullName)
+        if node is None:
+            raise KeyError('No attack step %s in the query index' % fullName)
+        return node
+
+    #------------------Assets-----------------
+    def assets_of_type(self, assetType):
+        row = self.typeRows.get(assetType)
+        return [] if row is None else [self.assetNames[asset] for asset in self.columns.row('type_assets', row)]
+
+    def asset_type(self, name):
+        return self.columns.string(self.columns.section('asset_type')[self._asset_row(name)])
+
+    #The assets directly under and directly above an asset in the hierarchy
+    def children(self, name):
+        return [self.assetNames[asset] for asset in self.columns.row('asset_children', self._asset_row(name))]
+
+    def parents(self, name):
+        return [self.assetNames[asset] for asset in self.columns.row('asset_parents', self._asset_row(name))]
+
+    #The assets under an asset in the hierarchy, of the given type if one is given, e.g. the
+    #LNs running on an IED: in_scope('IED1', 'LogicalNode')
+    def in_scope(self, name, assetType=None):
+        row = self.scopeRows.get(name)
+        if row is not None:
+            descendants = self.columns.row('scope_assets', row)
+        else:
+            descendants = _descendants(_RowLists(self.columns, 'asset_children'), self._asset_row(name))
+        if assetType is None:
+            return [self.assetNames[asset] for asset in descendants]
+        assetTypes = self.columns.section('asset_type')
+        typeString = self.columns.string
+        return [self.assetNames[asset] for asset in descendants if typeString(assetTypes[asset]) == assetType]
+
+    #The assets above an asset in the hierarchy
+    def scopes_of(self, name):
+        return [self.assetNames[asset] for asset in _descendants(_RowLists(self.columns, 'asset_parents'),
+                                                                 self._asset_row(name))]
+
+    #------------------Attack steps-----------------
+    #The attack steps with a step name, e.g. steps('manipulate')
+    def steps(self, stepName):
+        row = self.stepRows.get(stepName)
+        return [] if row is None else self._full_names(self.columns.row('step_nodes', row))
+
+    def steps_of(self, name):
+        return self._full_names(self.columns.row('asset_nodes', self._asset_row(name)))
+
+    def step_children(self, fullName):
+        return self._full_names(self.columns.row('node_children', self._node(fullName)))
+
+    def step_parents(self, fullName):
+        return self._full_names(self.columns.row('node_parents', self._node(fullName)))
+
+    #------------------Reachability-----------------
+    #The entry points with a reachability summary, the subnets, access points and IEDs
+    def entry_points(self):
+        return list(self.scenarioRows)
+
+    def critical_steps(self):
+        return self._full_names(self.columns.section('critical_nodes'))
+
+    def reached_from(self, entry):
+        return self._full_names(self.columns.row('scenario_reached', self._scenario_row(entry)))
+
+    def critical_reached_from(self, entry):
+        return self._full_names(self.columns.row('scenario_critical', self._scenario_row(entry)))
+
+    def is_reached_from(self, entry, fullName):
+        return self._is_reached(self._scenario_row(entry), self._node(fullName))
+
+    def _is_reached(self, scenario, node):
+        reached = self.columns.row('scenario_reached', scenario)
+        i = bisect_left(reached, node)
+        return i < len(reached) and reached[i] == node
+
+    #The entry points an attack step is reached from
+    def entries_reaching(self, fullName):
+        node = self._node(fullName)
+        return [entry for entry, scenario in self.scenarioRows.items() if self._is_reached(scenario, node)]
+
+    #The attack steps reached from an entry point that lead to the targets (full names, the critical
+    #steps by default), e.g. the steps that reach the XCBR actuators from subnet SN1: steps_reaching('SN1')
+    def steps_reaching(self, entry, targets=None):
+        scenario = self._scenario_row(entry)
+        targetNodes = list(self.columns.section('critical_nodes')) if targets is None else \
+            [self._node(fullName) for fullName in targets]
+        seen = set()
+        stack = [node for node in targetNodes if self._is_reached(scenario, node)]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(parent for parent in self.columns.row('node_parents', node)
+                         if parent not in seen and self._is_reached(scenario, parent))
+        return self._full_names(sorted(seen))
+
+#The rows of a CSR section pair as a list-like object
+class _RowLists:
+    def __init__(self, columns, name):
+        self.columns = columns
+        self.name = name
+
+    def __getitem__(self, i):
+        return self.columns.row(self.name, i)
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+
+from maltoolbox.attackgraph import AttackGraph
+
+from scl_apriori import calculate_viability_and_necessity
+
+logger = logging.getLogger(__name__)
+
+#The attack step an attacker enters each type of asset with, entry_point_scenarios makes one
+#scenario per asset of these types
+ENTRY_STEPS = {
+    'SubNetwork': 'accessUninspected',
+    'AccessPoint': 'accessNetworksUninspected',
+    'IEDHardware': 'physicalAccess',
+}
+
+#The attack steps of the ActuatorCB of a circuit breaker that trip it, the critical steps of a sweep
+#are those of the ActuatorCBs represented by an XCBR logical node
+TRIP_STEPS = ('manipulate',)
+
+#Node kinds of the reachability arrays, steps that are not viable are never traversed
+BLOCKED = 0
+OR = 1
+AND = 2
+
+#An attacker, or several attackers acting together, entering the graph at the given entry points
+#(full names of attack steps, 'asset name:attack step')
+class Scenario:
+    def __init__(self, name, entry_points):
+        self.name = name
+        self.entry_points = list(entry_points)
+
+    def __repr__(self):
+        return 'Scenario(%s, %d entry points)' % (self.name, len(self.entry_points))
+
+#One scenario per subnet, access point and IED (or the asset types of entry_steps)
+def entry_point_scenarios(attack_graph, entry_steps=ENTRY_STEPS):
+    return [Scenario(str(asset.name), [asset.name + ':' + entry_steps[asset.type]])
+            for asset in attack_graph.model.assets if asset.type in entry_steps]
+
+#The scenarios of the attackers of the model
+def attacker_scenarios(model):
+    return [Scenario(str(attacker.name), [asset.name + ':' + step for asset, steps in attacker.entry_points for step in steps])
+            for attacker in model.attackers]
+
+#The trip steps of the ActuatorCBs represented by an XCBR logical node
+def trip_steps(attack_graph, steps=TRIP_STEPS):
+    critical = []
+    for asset in attack_graph.model.assets:
+        if asset.type != 'ActuatorCB':
+            continue
+        logicalNodes = [ln for association in asset.associations if association.__class__.__name__ == 'ActRepresent'
+                        for ln in association.logicalNode]
+        if not any(str(ln.name).startswith('XCBR_') for ln in logicalNodes):
+            continue
+        for step in steps:
+            ag_node = attack_graph.get_node_by_full_name(asset.name + ':' + step)
+            if ag_node is not None:
+                critical.append(ag_node)
+    return critical
+
+#The attack graph as flat arrays for reachability: the distinct children of each node (CSR), the
+#kind of each node and, for 'and' nodes, the number of their distinct necessary parents
+def _graph_arrays(attack_graph):
+    nodes = attack_graph.nodes
+    position = {ag_node.id: i for i, ag_node in enumerate(nodes)}
+    offsets = array('q', [0])
+    targets = array('i')
+    kinds = bytearray(len(nodes))
+    necessary = bytearray(len(nodes))
+    needed = array('i', bytes(4 * len(nodes)))
+    for i, ag_node in enumerate(nodes):
+        targets.extend(dict.fromkeys(position[child.id] for child in ag_node.children))
+        offsets.append(len(targets))
+        necessary[i] = bool(ag_node.is_necessary)
+        if ag_node.is_viable and ag_node.type == 'or':
+            kinds[i] = OR
+        elif ag_node.is_viable and ag_node.type == 'and':
+            kinds[i] = AND
+            needed[i] = len({parent.id for parent in ag_node.parents if parent.is_necessary})
+    return position, (offsets, targets, kinds, necessary, needed)
+
+#The steps an attacker starting from the entry points (node positions) reaches, as a bytearray
+#flag per node. This is the closure of the attack surface of maltoolbox (query.get_attack_surface):
+#viable 'or' children of reached steps, and viable 'and' children whose necessary parents are all
+#reached. The steps are found in a single pass, counting the necessary parents still missing.
+def reachable(arrays, entries):
+    offsets, targets, kinds, necessary, needed = arrays
+    reached = bytearray(len(kinds))
+    missing = {}
+    stack = []
+    for i in entries:
+        if not reached[i]:
+            reached[i] = 1
+            stack.append(i)
+    while stack:
+        i = stack.pop()
+        isNecessary = necessary[i]
+        for k in range(offsets[i], offsets[i + 1]):
+            child = targets[k]
+            if reached[child]:
+                continue
+            kind = kinds[child]
+            if kind == AND:
+                remaining = missing.get(child, needed[child])
+                if isNecessary:
+                    remaining -= 1
+                    missing[child] = remaining
+                if remaining:
+                    continue
+            elif kind != OR:
+                continue
+            reached[child] = 1
+            stack.append(child)
+    return reached
+
+#Worker process state, the arrays of the graph sent once per worker
+_arrays = None
+_critical = None
+
+def _init_worker(arrays, critical):
+    global _arrays, _critical
+    _arrays, _critical = arrays, critical
+
+def _evaluate(entries):
+    reached = reachable(_arrays, entries)
+    return sum(reached), [i for i in _critical if reached[i]]
+
+def _evaluate_reached(entries):
+    return array('q', compress(range(len(_arrays[2])), reachable(_arrays, entries)))
+
+#Evaluates many scenarios against one attack graph, built once and never modified or copied.
+#The viability and necessity of the graph must have been calculated. The graph is flattened
+#into arrays that are shared with the worker processes, each scenario is evaluated on them.
+class ScenarioSweep:
+    def __init__(self, attack_graph, critical=None):
+        self.attack_graph = attack_graph
+        self.nodes = list(attack_graph.nodes)
+        self.position, self.arrays = _graph_arrays(attack_graph)
+        self.critical = [self.position[ag_node.id] for ag_node in
+                         (critical if critical is not None else trip_steps(attack_graph))]
+
+    def _entries(self, scenario):
+        entries = []
+        for full_name in scenario.entry_points:
+            ag_node = self.attack_graph.get_node_by_full_name(full_name)
+            if ag_node is None:
+                logger.warning('Failed to find entry point %s of scenario %s', full_name, scenario.name)
+                continue
+            entries.append(self.position[ag_node.id])
+        return entries
+
+    #The steps reached in a scenario
+    def reached_steps(self, scenario):
+        reached = reachable(self.arrays, self._entries(scenario))
+        return [self.nodes[i] for i in range(len(reached)) if reached[i]]
+
+    #Evaluate the scenarios, in workers processes when workers > 1, and return one result per scenario:
+    #its entry points, the number of steps reached and the critical steps reached
+    def run(self, scenarios, workers=1):
+        evaluated = self._map(_evaluate, scenarios, workers)
+        results = []
+        for scenario, (reachedCount, critical) in zip(scenarios, evaluated):
+            results.append({
+                'scenario': scenario.name,
+                'entry_points': scenario.entry_points,
+                'reached_steps': reachedCount,
+                'critical_reached': [self.nodes[i].full_name for i in critical],
+                'critical_total': len(self.critical),
+            })
+        return results
+
+    #The positions (in attack_graph.nodes) of the steps reached in each scenario, in ascending order
+    def reached(self, scenarios, workers=1):
+        return self._map(_evaluate_reached, scenarios, workers)
+
+    def _map(self, evaluate, scenarios, workers):
+        entries = [self._entries(scenario) for scenario in scenarios]
+        if workers > 1 and len(scenarios) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.arrays, self.critical)) as executor:
+                return list(executor.map(evaluate, entries, chunksize=max(1, len(entries) // (workers * 4))))
+        _init_worker(self.arrays, self.critical)
+        return [evaluate(scenarioEntries) for scenarioEntries in entries]
+
+
+def main():
+    from scl_parser_v1 import SclParser
+
+    argParser = argparse.ArgumentParser(
+        description='Evaluate every subnet, access point and IED of an SCD file as an attacker entry point and '
+                    'report the circuit breaker trip steps each one reaches.')
+    argParser.add_argument('scd_file')
+    argParser.add_argument('-l', '--lang', default='sasLang', help='the sasLang .mar archive')
+    argParser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    argParser.add_argument('-o', '--output', default='scenarios.json', help='the JSON file of the results')
+    args = argParser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s')
+    parser = SclParser(args.lang)
+    attack_graph = AttackGraph(parser.lang_graph, parser.parse(args.scd_file))
+    calculate_viability_and_necessity(attack_graph)
+    sweep = ScenarioSweep(attack_graph)
+    results = sweep.run(entry_point_scenarios(attack_graph), args.workers)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    for result in sorted(results, key=lambda result: -len(result['critical_reached'])):
+        print('%-40s %8d steps  %4d/%d trip steps' % (result['scenario'], result['reached_steps'],
+                                                      len(result['critical_reached']), result['critical_total']))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,190 @@
+import argparse
+
+#LN classes given to the LNs of the generated IEDs, in this order
+LN_CLASSES = ('XCBR', 'CSWI', 'XSWI', 'TVTR', 'PTOC', 'MMXU', 'GGIO', 'CILO')
+
+#Conducting equipment types, used in this order in every bay, and the LN class representing them
+EQUIPMENT_TYPES = (('CBR', 'XCBR'), ('VTR', 'TVTR'), ('DIS', 'XSWI'))
+
+#LN classes given to the client LNs, written straight under an access point without a Server
+CLIENT_LN_CLASSES = ('IHMI', 'ITCI', 'ITMI')
+
+#LN class of the LNodes that are not allocated to an IED (iedName="None")
+UNASSIGNED_LN_CLASS = 'CILO'
+
+#The generated documents at scale n have n substations, see scale_parameters
+SCALE_PARAMETERS = {
+    'voltage_levels': 2,
+    'bays': 4,
+    'equipment': 3,
+    'access_points': 1,
+    'ldevices': 2,
+    'lns': 8,
+    'subnetworks': 1,
+}
+
+def scale_parameters(scale):
+    parameters = dict(SCALE_PARAMETERS, substations=scale)
+    parameters['subnetworks'] = max(1, scale // 4)
+    return parameters
+
+#Write a synthetic SCD file (Header, Substation*, Communication, IED*, DataTypeTemplates) and return
+#the number of elements written per element type. There are substations x voltage_levels x bays
+#bays with equipment conducting equipment each (CBR, VTR and DIS in turn), or with the number of
+#equipment of each type given by equipment_types, e.g. {'CBR': 2, 'DIS': 4}. Every bay has its own IED
+#unless ieds is given, in which case the bays share the IEDs round robin. Each IED has access_points
+#access points connected to the subnetworks in turn, and ldevices LDevices with an LLN0 and lns LNs
+#under the Server of its first access point. With client_lns, the last access point of each IED has
+#no Server and client_lns LNs straight under it, this needs two access points or more.
+#The LNodes of the bays and equipment reference the LD0 LNs of the IED of their bay. With
+#unassigned_lnodes, the first unassigned_lnodes equipment of every bay also have an LNode that is
+#not allocated to an IED (iedName="None").
+def generate_scd(filename, substations=1, voltage_levels=2, bays=4, equipment=3, ieds=None,
+                 access_points=1, ldevices=2, lns=8, subnetworks=1, equipment_types=None,
+                 client_lns=0, unassigned_lnodes=0):
+    if client_lns and access_points < 2:
+        raise ValueError('client_lns needs two access points or more, the first one holds the Server')
+    lnClasses = dict(EQUIPMENT_TYPES)
+    if equipment_types is None:
+        bayEquipment = [EQUIPMENT_TYPES[e % len(EQUIPMENT_TYPES)][0] for e in range(equipment)]
+    else:
+        unknown = set(equipment_types) - set(lnClasses)
+        if unknown:
+            raise ValueError('Unknown equipment types %s, the types are %s'
+                             % (', '.join(sorted(unknown)), ', '.join(lnClasses)))
+        bayEquipment = [eqType for eqType in lnClasses for _ in range(equipment_types.get(eqType, 0))]
+
+    counts = {}
+    def count(tag, n=1):
+        counts[tag] = counts.get(tag, 0) + n
+
+    bayCount = substations * voltage_levels * bays
+    iedCount = ieds if ieds is not None else max(1, bayCount)
+    iedNames = ['IED%d' % (i + 1) for i in range(iedCount)]
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        write = f.write
+        write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        write('<SCL xmlns="http://www.iec.ch/61850/2003/SCL" version="2007" revision="B">\n')
+        write('  <Header id="synthetic" toolID="scl_synthetic"/>\n')
+        count('SCL')
+        count('Header')
+
+        bayIndex = 0
+        for s in range(substations):
+            substationName = 'S%d' % (s + 1)
+            write('  <Substation name="%s">\n' % substationName)
+            write('    <PowerTransformer name="%s_T1" type="PTR"/>\n' % substationName)
+            write('    <LNode iedName="%s" ldInst="LD0" lnClass="LLN0" lnInst=""/>\n' % iedNames[0])
+            count('Substation')
+            count('PowerTransformer')
+            count('LNode')
+            for v in range(voltage_levels):
+                write('    <VoltageLevel name="%s_VL%d">\n' % (substationName, v + 1))
+                count('VoltageLevel')
+                for b in range(bays):
+                    iedName = iedNames[bayIndex % iedCount]
+                    bayIndex += 1
+                    write('      <Bay name="%s_VL%d_B%d">\n' % (substationName, v + 1, b + 1))
+                    write('        <LNode iedName="%s" ldInst="LD0" lnClass="CSWI" lnInst="1"/>\n' % iedName)
+                    count('Bay')
+                    count('LNode')
+                    for e, eqType in enumerate(bayEquipment):
+                        write('        <ConductingEquipment name="Q%d" type="%s">\n' % (e + 1, eqType))
+                        write('          <LNode iedName="%s" ldInst="LD0" lnClass="%s" lnInst="1"/>\n'
+                              % (iedName, lnClasses[eqType]))
+                        count('ConductingEquipment')
+                        count('LNode')
+                        if e < unassigned_lnodes:
+                            write('          <LNode iedName="None" ldInst="LD0" lnClass="%s" lnInst="%d"/>\n'
+                                  % (UNASSIGNED_LN_CLASS, e + 1))
+                            count('LNode')
+                        write('        </ConductingEquipment>\n')
+                    write('      </Bay>\n')
+                write('    </VoltageLevel>\n')
+            write('  </Substation>\n')
+
+        write('  <Communication>\n')
+        count('Communication')
+        for n in range(subnetworks):
+            write('    <SubNetwork name="SN%d" type="8-MMS">\n' % (n + 1))
+            count('SubNetwork')
+            apIndex = 0
+            for iedName in iedNames:
+                for a in range(access_points):
+                    if apIndex % subnetworks == n:
+                        write('      <ConnectedAP iedName="%s" apName="%s_AP%d"/>\n' % (iedName, iedName, a + 1))
+                        count('ConnectedAP')
+                    apIndex += 1
+            write('    </SubNetwork>\n')
+        write('  </Communication>\n')
+
+        for iedName in iedNames:
+            write('  <IED name="%s" manufacturer="synthetic" type="BCU">\n' % iedName)
+            count('IED')
+            for a in range(access_points):
+                write('    <AccessPoint name="%s_AP%d">\n' % (iedName, a + 1))
+                count('AccessPoint')
+                if a == 0:
+                    write('      <Server>\n')
+                    count('Server')
+                    for d in range(ldevices):
+                        write('        <LDevice inst="LD%d">\n' % d)
+                        write('          <LN0 lnClass="LLN0" inst="" lnType="LLN0_T"/>\n')
+                        count('LDevice')
+                        count('LN0')
+                        for i in range(lns):
+                            write('          <LN lnClass="%s" inst="%d" lnType="%s_T"/>\n'
+                                  % (LN_CLASSES[i % len(LN_CLASSES)], i // len(LN_CLASSES) + 1,
+                                     LN_CLASSES[i % len(LN_CLASSES)]))
+                        count('LN', lns)
+                        write('        </LDevice>\n')
+                    write('      </Server>\n')
+                elif client_lns and a == access_points - 1:
+                    for i in range(client_lns):
+                        lnClass = CLIENT_LN_CLASSES[i % len(CLIENT_LN_CLASSES)]
+                        write('      <LN lnClass="%s" inst="%d" lnType="%s_T"/>\n'
+                              % (lnClass, i // len(CLIENT_LN_CLASSES) + 1, lnClass))
+                    count('LN', client_lns)
+                write('    </AccessPoint>\n')
+            write('  </IED>\n')
+
+        write('  <DataTypeTemplates/>\n')
+        write('</SCL>\n')
+        count('DataTypeTemplates')
+    return counts
+
+
+def main():
+    argParser = argparse.ArgumentParser(description='Write a synthetic SCD file.')
+    argParser.add_argument('output', help='the SCD file to write')
+    argParser.add_argument('-s', '--scale', type=int, default=1,
+                           help='number of substations, the other sizes default to those of SCALE_PARAMETERS')
+    for name, default in SCALE_PARAMETERS.items():
+        if name != 'subnetworks':
+            argParser.add_argument('--' + name.replace('_', '-'), type=int, default=None, help='default %d' % default)
+    argParser.add_argument('--subnetworks', type=int, default=None, help='default scale / 4, at least 1')
+    argParser.add_argument('--ieds', type=int, default=None, help='default one per bay')
+    argParser.add_argument('--equipment-types', default=None,
+                           help='equipment of each type per bay, e.g. CBR=2,DIS=4, instead of --equipment')
+    argParser.add_argument('--client-lns', type=int, default=None,
+                           help='LNs straight under the last access point of each IED, default 0')
+    argParser.add_argument('--unassigned-lnodes', type=int, default=None,
+                           help='equipment per bay with an LNode not allocated to an IED, default 0')
+    args = argParser.parse_args()
+
+    parameters = scale_parameters(args.scale)
+    for name in list(parameters) + ['ieds', 'client_lns', 'unassigned_lnodes']:
+        if getattr(args, name, None) is not None:
+            parameters[name] = getattr(args, name)
+    if args.equipment_types is not None:
+        parameters['equipment_types'] = {eqType: int(n) for eqType, n in
+                                         (item.split('=') for item in args.equipment_types.split(','))}
+    counts = generate_scd(args.output, **parameters)
+    print('%s: %d elements (%s)' % (args.output, sum(counts.values()),
+                                    ', '.join('%d %s' % (n, tag) for tag, n in counts.items())))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+from array import array
+
+from maltoolbox.exceptions import DuplicateModelAssociationError
+
+#Collects the assets and associations of an instance model in typed tables and adds them to the
+#model in bulk. Assets are referred to by handles, their index in model.assets once committed, so
+#rows can reference assets that are still pending as well as assets committed earlier.
+#Model.add_association compares every new association with all the associations of its type
+#already in the model, which makes building a model quadratic. The tables check for duplicates
+#with a set of (type, left asset, right asset) keys instead and add the associations directly.
+#The assets and associations are added in the order of the rows, so the model, the asset ids and
+#the duplicate name suffixes are the same as with add_asset and add_association.
+#The tables must be the only way assets and associations are added to the model.
+class ModelTables:
+    def __init__(self, model):
+        self.model = model
+        self.ns = model.lang_classes_factory.ns
+        #Interned asset and association types, by name and by type index
+        self.assetTypeIndex = {}
+        self.assetClasses = []
+        self.assocTypeIndex = {}
+        self.assocClasses = []
+        #Left and right field names of the association types
+        self.assocFields = []
+        #Pending asset rows
+        self.assetTypes = array('i')
+        self.assetNames = []
+        #Pending association rows, the handles of the left and right assets
+        self.assocTypes = array('i')
+        self.assocLeft = array('q')
+        self.assocRight = array('q')
+        #Keys of the committed and pending associations
+        self.assocKeys = set()
+        self.committedAssets = len(model.assets)
+        self.committedAssociations = len(model.associations)
+
+    #Number of assets and associations in the model once the pending rows are committed
+    def asset_count(self):
+        return self.committedAssets + len(self.assetTypes)
+
+    def association_count(self):
+        return self.committedAssociations + len(self.assocTypes)
+
+    #Add an asset of the given sasLang class and return its handle
+    def add_asset(self, assetType, name):
+        typeIndex = self.assetTypeIndex.get(assetType)
+        if typeIndex is None:
+            typeIndex = self.assetTypeIndex[assetType] = len(self.assetClasses)
+            self.assetClasses.append(getattr(self.ns, assetType))
+        self.assetTypes.append(typeIndex)
+        self.assetNames.append(name)
+        return self.asset_count() - 1
+
+    #Add an association between two asset handles, given as the two fields of the association,
+    #e.g. add_association('SysExecution', hostHardware = ied, sysExecutedApps = server)
+    def add_association(self, assocType, **fields):
+        typeIndex = self.assocTypeIndex.get(assocType)
+        if typeIndex is None:
+            typeIndex = self.assocTypeIndex[assocType] = len(self.assocClasses)
+            assocClass = getattr(self.ns, assocType)
+            self.assocClasses.append(assocClass)
+            self.assocFields.append(tuple(assocClass()._properties.keys()))
+        leftField, rightField = self.assocFields[typeIndex]
+        left, right = fields[leftField], fields[rightField]
+        key = (typeIndex, left, right)
+        if key in self.assocKeys:
+            raise DuplicateModelAssociationError(
+                'Association type %s already exists between %s and %s' % (assocType, self._name(left), self._name(right)))
+        self.assocKeys.add(key)
+        self.assocTypes.append(typeIndex)
+        self.assocLeft.append(left)
+        self.assocRight.append(right)
+
+    def _name(self, handle):
+        if handle < self.committedAssets:
+            return self.model.assets[handle].name
+        return self.assetNames[handle - self.committedAssets]
+
+    #The committed asset of a handle
+    def asset(self, handle):
+        return self.model.assets[handle]
+
+    #Add the pending rows to the model
+    def commit(self):
+        model = self.model
+        assetClasses = self.assetClasses
+        for typeIndex, name in zip(self.assetTypes, self.assetNames):
+            model.add_asset(assetClasses[typeIndex](name = name))
+
+        assets = model.assets
+        associations = []
+        for typeIndex, left, right in zip(self.assocTypes, self.assocLeft, self.assocRight):
+            leftField, rightField = self.assocFields[typeIndex]
+            association = self.assocClasses[typeIndex]()
+            setattr(association, leftField, [assets[left]])
+            setattr(association, rightField, [assets[right]])
+            associations.append((association, (assets[left], assets[right])))
+        add_associations(model, associations)
+
+        self.assetTypes = array('i')
+        self.assetNames = []
+        self.assocTypes = array('i')
+        self.assocLeft = array('q')
+        self.assocRight = array('q')
+        self.committedAssets = len(model.assets)
+        self.committedAssociations = len(model.associations)
+
+#Add associations, whose fields are set, to the model in bulk, given as (association, assets) pairs
+#with the left and right assets of each association. The associations are not checked for duplicates,
+#Model.add_association does so by comparing with all the associations of the same type, which makes
+#adding them one by one quadratic, the caller checks them with a set of keys instead.
+def add_associations(model, associations):
+    #The associations of each asset, set once per asset
+    assetAssociations = {}
+    typeToAssociation = model._type_to_association
+    for association, assets in associations:
+        association.extras = {}
+        for asset in assets:
+            assetAssociations.setdefault(id(asset), (asset, []))[1].append(association)
+        model.associations.append(association)
+        typeToAssociation.setdefault(association.__class__.__name__, []).append(association)
+    for asset, associations in assetAssociations.values():
+        asset.associations = list(asset.associations) + associations
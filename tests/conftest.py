@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from scl_synthetic import generate_scd
+
+#The parser of the tests, the language graph is loaded once per session
+@pytest.fixture(scope='session')
+def parser(tmp_path_factory):
+    from scl_parser_v1 import SclParser
+    return SclParser(os.path.join(REPO_DIR, 'sasLang'), str(tmp_path_factory.mktemp('lang_cache')))
+
+#Writes a small synthetic SCD file, keyword arguments are those of scl_synthetic.generate_scd
+@pytest.fixture
+def synthetic_scd(tmp_path):
+    def write(name='synthetic.scd', **parameters):
+        parameters = dict(dict(voltage_levels=1, bays=2, equipment=3, ldevices=1, lns=8), **parameters)
+        filename = str(tmp_path / name)
+        generate_scd(filename, **parameters)
+        return filename
+    return write
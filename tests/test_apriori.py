@@ -0,0 +1,56 @@
+import random
+import sys
+
+from maltoolbox.attackgraph import AttackGraph
+from maltoolbox.attackgraph.analyzers import apriori
+
+import scl_apriori
+
+def _state(attack_graph):
+    return [(ag_node.id, ag_node.is_viable, ag_node.is_necessary) for ag_node in attack_graph.nodes]
+
+#The maltoolbox calculation, on a graph whose values were already calculated once
+def _reference(attack_graph):
+    for ag_node in attack_graph.nodes:
+        ag_node.is_viable = True
+        ag_node.is_necessary = True
+    apriori.calculate_viability_and_necessity(attack_graph)
+
+def test_apriori_matches_maltoolbox(parser, synthetic_scd, monkeypatch):
+    #The maltoolbox calculation recurses along the paths of the graph
+    monkeypatch.setattr(sys, 'getrecursionlimit', sys.getrecursionlimit)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+    model = parser.parse(synthetic_scd())
+    reference = AttackGraph(parser.lang_graph, model)
+    attack_graph = AttackGraph(parser.lang_graph, model)
+    apriori.calculate_viability_and_necessity(reference)
+    scl_apriori.calculate_viability_and_necessity(attack_graph)
+    assert _state(attack_graph) == _state(reference)
+    assert not all(viable and necessary for _, viable, necessary in _state(attack_graph))
+
+    #Random what-if changes, each one checked against a full maltoolbox calculation
+    rnd = random.Random(12)
+    defenses = [ag_node for ag_node in attack_graph.nodes if ag_node.type == 'defense']
+    exists = [ag_node for ag_node in attack_graph.nodes if ag_node.type in ('exist', 'notExist')]
+    for _ in range(30):
+        before = dict((nodeId, (viable, necessary)) for nodeId, viable, necessary in _state(attack_graph))
+        if rnd.random() < 0.7:
+            ag_node = rnd.choice(defenses)
+            status = rnd.choice((0.0, 1.0))
+            changed = scl_apriori.set_defense_status(ag_node, status)
+            reference.get_node_by_id(ag_node.id).defense_status = status
+        else:
+            ag_node = rnd.choice(exists)
+            status = not ag_node.existence_status
+            changed = scl_apriori.set_existence_status(ag_node, status)
+            reference.get_node_by_id(ag_node.id).existence_status = status
+        _reference(reference)
+        assert _state(attack_graph) == _state(reference)
+        assert {step.id for step in changed} == {nodeId for nodeId, viable, necessary in _state(attack_graph)
+                                                 if before[nodeId] != (viable, necessary)}
+
+    #Updating every step from scratch gives the full calculation
+    for ag_node in attack_graph.nodes:
+        ag_node.is_viable = ag_node.is_necessary = True
+    scl_apriori.update_viability_and_necessity(attack_graph, attack_graph.nodes)
+    assert _state(attack_graph) == _state(reference)
@@ -0,0 +1,82 @@
+import os
+
+from scl_cache import OutputCache
+
+SCD = '''<?xml version="1.0" encoding="UTF-8"?>
+<SCL xmlns="http://www.iec.ch/61850/2003/SCL" version="2007" revision="B">
+  <Header id="%s" toolID="tool"/>
+  <Substation name="S1">
+    <VoltageLevel name="VL1">%s
+      <Bay %s/>
+    </VoltageLevel>
+  </Substation>
+  <Communication>
+    <SubNetwork name="SN1" type="8-MMS">
+      <ConnectedAP iedName="IED1" apName="AP1"/>
+    </SubNetwork>
+  </Communication>
+</SCL>
+'''
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+#Attribute order, whitespace, comments and the Header do not change the key, the content does
+def test_key_is_canonical(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'))
+    langFile = _write(tmp_path / 'lang.mar', 'lang')
+    def key(name, header='h1', comment='', bay='name="B1" desc="bay"'):
+        return cache.key(_write(tmp_path / name, SCD % (header, comment, bay)), langFile, 1)
+
+    reference = key('reference.scd')
+    assert key('reordered.scd', bay='desc="bay"   name="B1"') == reference
+    assert key('whitespace.scd', comment='\n\n        <!-- a comment -->\n') == reference
+    assert key('header.scd', header='h2') == reference
+    assert key('changed.scd', bay='name="B2" desc="bay"') != reference
+    assert cache.key(os.path.join(tmp_path, 'reference.scd'), langFile, 2) != reference
+
+def _put(cache, key, outputDir, size):
+    os.makedirs(outputDir, exist_ok=True)
+    _write(os.path.join(outputDir, 'threat_model.yml'), 'x' * size)
+    cache.put(key, outputDir, files=['threat_model.yml'])
+    return os.path.join(cache.cache_dir, key)
+
+#The least recently used entries are evicted until the cache fits in max_size
+def test_lru_eviction(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), max_size=2500)
+    first = _put(cache, 'first', str(tmp_path / 'first'), 1000)
+    second = _put(cache, 'second', str(tmp_path / 'second'), 1000)
+    os.utime(first, (1000, 1000))
+    os.utime(second, (2000, 2000))
+    #Reading the first entry makes it the most recently used
+    assert cache.get('first', str(tmp_path / 'out'), files=['threat_model.yml']) is not None
+    third = _put(cache, 'third', str(tmp_path / 'third'), 1000)
+    assert os.path.isdir(first) and os.path.isdir(third) and not os.path.exists(second)
+    assert cache.evictions == 1
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1 and stats['size'] <= 2500
+
+    cache.evict(max_size=0)
+    assert cache.stats()['entries'] == 0
+
+#Hits and misses are counted by each cache and shared through the cache directory
+def test_stats(tmp_path):
+    cacheDir = str(tmp_path / 'cache')
+    cache = OutputCache(cacheDir)
+    assert cache.get('key', str(tmp_path / 'out'), files=['threat_model.yml']) is None
+    outputDir = str(tmp_path / 'outputs')
+    os.makedirs(outputDir)
+    _write(os.path.join(outputDir, 'threat_model.yml'), 'model')
+    cache.put('key', outputDir, info={'assets': 3}, files=['threat_model.yml'])
+    assert cache.get('key', str(tmp_path / 'out'), files=['threat_model.yml']) == {'assets': 3}
+    with open(os.path.join(str(tmp_path / 'out'), 'threat_model.yml'), encoding='utf-8') as f:
+        assert f.read() == 'model'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    other = OutputCache(cacheDir)
+    assert other.get('key', str(tmp_path / 'other'), files=['threat_model.yml']) is not None
+    assert (other.hits, other.misses) == (1, 0)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (2, 1, 0, 1)
@@ -0,0 +1,30 @@
+import pytest
+
+from scl_columnar import ColumnarFile, load_attack_graph, load_model
+from scl_parser_v1 import run_pipeline
+
+#The model and the attack graphs loaded from the columnar files save the same YAML as the originals
+def test_round_trip(parser, synthetic_scd, tmp_path):
+    run_pipeline(parser, synthetic_scd(access_points=2, subnetworks=2), str(tmp_path), formats=('yml', 'sclc'))
+    model = load_model(str(tmp_path / 'threat_model.sclc'), parser.lang_classes_factory)
+    model.save_to_file(str(tmp_path / 'loaded_threat_model.yml'))
+    assert (tmp_path / 'loaded_threat_model.yml').read_bytes() == (tmp_path / 'threat_model.yml').read_bytes()
+    for name in ('ag', 'post_ag'):
+        attack_graph = load_attack_graph(str(tmp_path / (name + '.sclc')), model)
+        attack_graph.save_to_file(str(tmp_path / ('loaded_%s.yml' % name)))
+        assert (tmp_path / ('loaded_%s.yml' % name)).read_bytes() == (tmp_path / (name + '.yml')).read_bytes()
+
+def test_views_and_close(parser, synthetic_scd, tmp_path):
+    run_pipeline(parser, synthetic_scd(), str(tmp_path), formats=('sclc',))
+    #Copies outlive the file
+    with ColumnarFile(str(tmp_path / 'post_ag.sclc')) as columns:
+        children = list(columns.row('node_children', 0))
+        flags = columns.section('node_flags').tolist()
+    assert children and flags
+    #A view still referenced keeps the file from being closed
+    columns = ColumnarFile(str(tmp_path / 'post_ag.sclc'))
+    view = columns.row('node_children', 0)
+    with pytest.raises(BufferError):
+        columns.close()
+    view.release()
+    columns.close()
@@ -0,0 +1,79 @@
+import pytest
+
+from scl_incremental import IncrementalModel, association_identity
+
+#An SCD file with one bay and one IED per bay name, ieds maps the IED names to their LN classes
+#and subnets the subnetwork names to the IEDs connected to them
+def _write_scd(path, bays, ieds, subnets):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<SCL xmlns="http://www.iec.ch/61850/2003/SCL" version="2007" revision="B">',
+             '<Header id="test"/>', '<Substation name="S1">', '<VoltageLevel name="VL1">']
+    for bay, iedName in bays:
+        lines += ['<Bay name="%s">' % bay,
+                  '<LNode iedName="%s" ldInst="LD0" lnClass="CSWI" lnInst="1"/>' % iedName,
+                  '<ConductingEquipment name="Q1" type="CBR">',
+                  '<LNode iedName="%s" ldInst="LD0" lnClass="XCBR" lnInst="1"/>' % iedName,
+                  '</ConductingEquipment>', '</Bay>']
+    lines += ['</VoltageLevel>', '</Substation>', '<Communication>']
+    for subnet, connected in subnets.items():
+        lines.append('<SubNetwork name="%s">' % subnet)
+        lines += ['<ConnectedAP iedName="%s" apName="%s_AP1"/>' % (iedName, iedName) for iedName in connected]
+        lines.append('</SubNetwork>')
+    lines.append('</Communication>')
+    for iedName, lnClasses in ieds.items():
+        lines += ['<IED name="%s">' % iedName, '<AccessPoint name="%s_AP1">' % iedName, '<Server>',
+                  '<LDevice inst="LD0">', '<LN0 lnClass="LLN0" inst=""/>']
+        lines += ['<LN lnClass="%s" inst="1"/>' % lnClass for lnClass in lnClasses]
+        lines += ['</LDevice>', '</Server>', '</AccessPoint>', '</IED>']
+    lines.append('</SCL>')
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    return str(path)
+
+#The model and the attack graph in terms of SCD element identities, independent of asset ids
+def _canonical(incremental):
+    identityOf = incremental.identityOf
+    step = lambda ag_node: (identityOf[id(ag_node.asset)], ag_node.name)
+    assets = sorted(identityOf[id(asset)] for asset in incremental.model.assets)
+    associations = sorted(association_identity(incremental.model, association, identityOf)
+                          for association in incremental.model.associations)
+    nodes = sorted((step(ag_node), ag_node.type, ag_node.is_viable, ag_node.is_necessary,
+                    ag_node.existence_status, ag_node.defense_status,
+                    sorted(map(step, ag_node.children)), sorted(map(step, ag_node.parents)))
+                   for ag_node in incremental.attack_graph.nodes)
+    return assets, associations, nodes
+
+def test_update_matches_rebuild(parser, tmp_path):
+    revisions = [
+        _write_scd(tmp_path / 'rev1.scd', [('B1', 'IED1'), ('B2', 'IED2'), ('B3', 'IED3')],
+                   {'IED1': ['XCBR', 'CSWI'], 'IED2': ['XCBR', 'CSWI'], 'IED3': ['XCBR', 'CSWI']},
+                   {'SN1': ['IED1', 'IED2', 'IED3']}),
+        #A bay and its IED removed, an LN added to an IED
+        _write_scd(tmp_path / 'rev2.scd', [('B1', 'IED1'), ('B2', 'IED2')],
+                   {'IED1': ['XCBR', 'CSWI', 'MMXU'], 'IED2': ['XCBR', 'CSWI']},
+                   {'SN1': ['IED1', 'IED2']}),
+        #A second subnetwork
+        _write_scd(tmp_path / 'rev3.scd', [('B1', 'IED1'), ('B2', 'IED2')],
+                   {'IED1': ['XCBR', 'CSWI', 'MMXU'], 'IED2': ['XCBR', 'CSWI']},
+                   {'SN1': ['IED1'], 'SN2': ['IED2']}),
+    ]
+    incremental = IncrementalModel(parser, revisions[0])
+    for revision in revisions[1:]:
+        assert incremental.update(revision)
+        assert _canonical(incremental) == _canonical(IncrementalModel(parser, revision))
+    assert not incremental.update(revisions[-1])
+
+#A revision that fails to parse is not recorded, the next update diffs against the last applied one
+def test_failed_update_is_retried(parser, tmp_path):
+    ieds = {'IED1': ['XCBR', 'CSWI'], 'IED2': ['XCBR', 'CSWI']}
+    first = _write_scd(tmp_path / 'rev1.scd', [('B1', 'IED1')], ieds, {'SN1': ['IED1', 'IED2']})
+    #The LNodes of B2 are hosted on IEDX, which is not connected to any subnetwork
+    broken = _write_scd(tmp_path / 'broken.scd', [('B1', 'IED1'), ('B2', 'IEDX')], ieds, {'SN1': ['IED1', 'IED2']})
+    fixed = _write_scd(tmp_path / 'fixed.scd', [('B1', 'IED1'), ('B2', 'IED2')], ieds, {'SN1': ['IED1', 'IED2']})
+    incremental = IncrementalModel(parser, first)
+    before = _canonical(incremental)
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            incremental.update(broken)
+        assert _canonical(incremental) == before
+    assert incremental.update(fixed)
+    assert _canonical(incremental) == _canonical(IncrementalModel(parser, fixed))
@@ -0,0 +1,50 @@
+from maltoolbox.attackgraph import AttackGraph
+
+import scl_neo4j
+from scl_apriori import calculate_viability_and_necessity
+from scl_neo4j import KINDS, SCHEMA, RecordingDriver, ingest, model_rows
+
+UPSERTS = {'assets': scl_neo4j.UPSERT_ASSETS, 'associations': scl_neo4j.UPSERT_ASSOCIATIONS,
+           'steps': scl_neo4j.UPSERT_STEPS, 'edges': scl_neo4j.UPSERT_EDGES}
+DELETES = {'assets': scl_neo4j.DELETE_ASSETS, 'associations': scl_neo4j.DELETE_ASSOCIATIONS,
+           'steps': scl_neo4j.DELETE_STEPS, 'edges': scl_neo4j.DELETE_EDGES}
+
+def _build(parser, scdFile):
+    model = parser.parse(scdFile)
+    attack_graph = AttackGraph(parser.lang_graph, model)
+    calculate_viability_and_necessity(attack_graph)
+    return model, list(parser.units), attack_graph
+
+def _written(driver, queries):
+    return {kind: {row['key'] if isinstance(row, dict) else row for row in driver.rows(query)}
+            for kind, query in queries.items()}
+
+def test_ingest_revisions(parser, synthetic_scd):
+    #The second revision drops a bay (and its IED) and adds an LN to every LDevice
+    first = _build(parser, synthetic_scd('rev1.scd', bays=3, lns=8))
+    second = _build(parser, synthetic_scd('rev2.scd', bays=2, lns=9))
+
+    driver = RecordingDriver()
+    state = ingest(driver, 'substation1', *first, batch_size=50)
+    assert driver.closed
+    assert [query for query, _ in driver.batches[:len(SCHEMA)]] == list(SCHEMA)
+    rows = model_rows('substation1', *first)
+    assert _written(driver, UPSERTS) == {kind: set(rows[kind]) for kind in KINDS}
+    assert not any(_written(driver, DELETES).values())
+    assert state == {kind: {key: row['sig'] for key, row in rows[kind].items()} for kind in KINDS}
+
+    #Only the new and changed rows of the second revision are upserted, the removed ones are deleted
+    driver = RecordingDriver()
+    newState = ingest(driver, 'substation1', *second, state=state, batch_size=50)
+    newRows = model_rows('substation1', *second)
+    changed = {kind: {key for key, row in newRows[kind].items() if state[kind].get(key) != row['sig']} for kind in KINDS}
+    removed = {kind: set(state[kind]) - set(newRows[kind]) for kind in KINDS}
+    assert _written(driver, UPSERTS) == changed
+    assert _written(driver, DELETES) == removed
+    assert all(changed[kind] and removed[kind] for kind in ('assets', 'steps'))
+    assert sum(map(len, changed.values())) < sum(map(len, newRows.values()))
+
+    #Nothing but the schema is written again for an unchanged revision
+    driver = RecordingDriver()
+    assert ingest(driver, 'substation1', *second, state=newState) == newState
+    assert [query for query, _ in driver.batches] == list(SCHEMA)
@@ -0,0 +1,31 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from scl_index import SCL_NS
+
+#Streaming the file builds the same model, from the same units, as loading the whole document
+def test_streaming_matches_document(parser, synthetic_scd):
+    scdFile = synthetic_scd(substations=2, access_points=2, subnetworks=2)
+    streamed = parser.parse(scdFile, streaming = True)
+    streamedUnits = list(parser.units)
+    loaded = parser.parse(scdFile, streaming = False)
+    assert len(streamed.assets) > 0
+    assert streamed._to_dict() == loaded._to_dict()
+    assert streamedUnits == parser.units
+
+#A Substation section after the Communication section can only be parsed from the whole document
+def test_streaming_section_order(parser, synthetic_scd, tmp_path):
+    ET.register_namespace('', SCL_NS[1:-1])
+    tree = ET.parse(synthetic_scd(substations=2))
+    root = tree.getroot()
+    substation = root.findall(SCL_NS + 'Substation')[-1]
+    root.remove(substation)
+    root.insert(list(root).index(root.find(SCL_NS + 'Communication')) + 1, substation)
+    scdFile = str(tmp_path / 'reordered.scd')
+    tree.write(scdFile, encoding = 'utf-8', xml_declaration = True)
+
+    with pytest.raises(ValueError, match = 'out of the SCL section order'):
+        parser.parse(scdFile, streaming = True)
+    model = parser.parse(scdFile, streaming = False)
+    assert sum(1 for asset in model.assets if asset.type == 'Substation') == 2
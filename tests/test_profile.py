@@ -0,0 +1,43 @@
+import sys
+import tracemalloc
+
+import pytest
+
+import scl_profile
+from scl_profile import Profiler
+
+#The peak of a stage is the one reached during it, not the RSS at its end or an earlier peak
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason = 'the peak RSS is reset through /proc')
+def test_stage_peak_rss():
+    if scl_profile.hwm_mb() is None or not scl_profile.reset_peak_rss():
+        pytest.skip('/proc/self/clear_refs is not writable')
+    profiler = Profiler()
+    assert profiler.peak_source == 'rss'
+    with profiler.stage('outer'):
+        with profiler.stage('allocate'):
+            block = bytearray(256 * 1024 ** 2)
+            del block
+        with profiler.stage('small'):
+            pass
+    allocate, small, outer = profiler.stages['allocate'], profiler.stages['small'], profiler.stages['outer']
+    assert allocate['peak_rss_mb'] > allocate['rss_mb'] + 200
+    assert small['peak_rss_mb'] < allocate['peak_rss_mb'] - 200
+    #The peak of a stage includes the stages nested in it
+    assert outer['peak_rss_mb'] >= allocate['peak_rss_mb']
+    assert profiler.to_dict()['process_peak_rss_mb'] >= allocate['peak_rss_mb']
+
+def test_stage_peak_tracemalloc(monkeypatch):
+    monkeypatch.setattr(scl_profile, 'hwm_mb', lambda: None)
+    tracemalloc.start()
+    try:
+        profiler = Profiler()
+        assert profiler.peak_source == 'tracemalloc'
+        with profiler.stage('allocate'):
+            block = bytearray(64 * 1024 ** 2)
+            del block
+        with profiler.stage('small'):
+            pass
+    finally:
+        tracemalloc.stop()
+    assert profiler.stages['allocate']['peak_rss_mb'] > 60
+    assert profiler.stages['small']['peak_rss_mb'] < 60
@@ -0,0 +1,52 @@
+from maltoolbox.attackgraph import AttackGraph
+
+import scl_query
+from scl_apriori import calculate_viability_and_necessity
+from scl_query import QueryIndex, save_query_index
+from scl_scenarios import Scenario, ScenarioSweep, entry_point_scenarios
+
+#An entry point whose attack step is not in the graph is skipped, as in ScenarioSweep
+def test_missing_entry_step(parser, synthetic_scd, tmp_path, monkeypatch):
+    model = parser.parse(synthetic_scd())
+    attack_graph = AttackGraph(parser.lang_graph, model)
+    calculate_viability_and_necessity(attack_graph)
+    scenarios = entry_point_scenarios(attack_graph)
+    scenarios.append(Scenario('ghost', ['SN1:noSuchStep', scenarios[0].entry_points[0]]))
+    monkeypatch.setattr(scl_query, 'entry_point_scenarios', lambda attack_graph: scenarios)
+
+    filename = str(tmp_path / 'query_index.sclc')
+    save_query_index(model, attack_graph, filename)
+    index = QueryIndex(filename)
+    try:
+        assert index.entry_points() == [scenario.name for scenario in scenarios]
+        expected = sorted(ag_node.full_name for ag_node in ScenarioSweep(attack_graph).reached_steps(scenarios[0]))
+        assert sorted(index.reached_from('ghost')) == sorted(index.reached_from(scenarios[0].name)) == expected
+    finally:
+        index.close()
+
+#The assets linked to any of assets by an association type, from one of its fields to the other
+def _linked(model, associationType, fromField, toField, assets):
+    return [linked for association in model.associations if type(association).__name__ == associationType
+            if any(asset in assets for asset in getattr(association, fromField))
+            for linked in getattr(association, toField)]
+
+#A subnet holds the access points on it, the IEDs they connect and everything the IEDs run
+def test_subnet_scope(parser, synthetic_scd, tmp_path):
+    model = parser.parse(synthetic_scd(access_points=2, subnetworks=2))
+    attack_graph = AttackGraph(parser.lang_graph, model)
+    calculate_viability_and_necessity(attack_graph)
+    filename = str(tmp_path / 'query_index.sclc')
+    save_query_index(model, attack_graph, filename)
+
+    with QueryIndex(filename) as index:
+        for subnet in (asset for asset in model.assets if asset.type == 'SubNetwork'):
+            accessPoints = _linked(model, 'NetworkConnection', 'networks', 'netConnections', [subnet])
+            iedOSs = _linked(model, 'ApplicationConnection', 'appConnections', 'applications', accessPoints)
+            ieds = _linked(model, 'SysExecution', 'sysExecutedApps', 'hostHardware', iedOSs)
+            assert ieds
+            assert sorted(index.in_scope(str(subnet.name), 'IEDHardware')) == sorted(str(ied.name) for ied in ieds)
+            scope = set(index.in_scope(str(subnet.name)))
+            for ied in ieds:
+                assert set(index.in_scope(str(ied.name))) <= scope
+            assert set(index.in_scope(str(subnet.name), 'LogicalNode')) == \
+                {name for ied in ieds for name in index.in_scope(str(ied.name), 'LogicalNode')}
@@ -0,0 +1,46 @@
+from maltoolbox.attackgraph import AttackGraph, Attacker, query
+
+from scl_apriori import calculate_viability_and_necessity
+from scl_scenarios import Scenario, ScenarioSweep, entry_point_scenarios, trip_steps
+
+#The steps an attacker reaches from the entry points of a scenario, compromising every child that
+#maltoolbox finds traversable until the attack surface is exhausted
+def _attack_surface_closure(attack_graph, scenario, attackerId):
+    attacker = Attacker(scenario.name, id = attackerId)
+    stack = [attack_graph.get_node_by_full_name(full_name) for full_name in scenario.entry_points]
+    for ag_node in stack:
+        attacker.compromise(ag_node)
+    while stack:
+        for child in stack.pop().children:
+            if not child.is_compromised_by(attacker) and query.is_node_traversable_by_attacker(child, attacker):
+                attacker.compromise(child)
+                stack.append(child)
+    return attacker.reached_attack_steps
+
+#Physical access to an IED together with the credentials of its LD, which trips its circuit breaker
+def _credential_scenarios(attack_graph):
+    return [Scenario(str(asset.name) + ' with credentials',
+                     [asset.name + ':physicalAccess', asset.name + '_LD0:authenticate'])
+            for asset in attack_graph.model.assets if asset.type == 'IEDHardware']
+
+def test_sweep_matches_attack_surface(parser, synthetic_scd):
+    attack_graph = AttackGraph(parser.lang_graph, parser.parse(synthetic_scd()))
+    calculate_viability_and_necessity(attack_graph)
+    sweep = ScenarioSweep(attack_graph)
+    scenarios = entry_point_scenarios(attack_graph) + _credential_scenarios(attack_graph)
+    for attackerId, scenario in enumerate(scenarios):
+        expected = sorted(ag_node.id for ag_node in _attack_surface_closure(attack_graph, scenario, attackerId))
+        assert sorted(ag_node.id for ag_node in sweep.reached_steps(scenario)) == expected
+
+def test_trip_reached_with_credentials(parser, synthetic_scd):
+    attack_graph = AttackGraph(parser.lang_graph, parser.parse(synthetic_scd()))
+    calculate_viability_and_necessity(attack_graph)
+    sweep = ScenarioSweep(attack_graph)
+    critical = {ag_node.full_name for ag_node in trip_steps(attack_graph)}
+    assert critical
+    #A single entry point reaches no trip step, the credentials are needed as well
+    for result in sweep.run(entry_point_scenarios(attack_graph)):
+        assert result['critical_reached'] == []
+    reached = [result['critical_reached'] for result in sweep.run(_credential_scenarios(attack_graph))]
+    assert all(len(critical_reached) == 1 for critical_reached in reached)
+    assert {full_name for critical_reached in reached for full_name in critical_reached} == critical
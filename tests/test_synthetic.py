@@ -0,0 +1,41 @@
+import pytest
+
+from scl_synthetic import generate_scd
+
+def _associated(model, asset, associationType):
+    return sorted(str(other.name) for association in asset.associations if type(association).__name__ == associationType
+                  for fieldName in model.get_association_field_names(association)
+                  for other in getattr(association, fieldName) if other is not asset)
+
+#The equipment counts of every type, the client LNs and the LNodes without an IED reach their parser branches
+def test_generated_branches(parser, synthetic_scd):
+    scdFile = synthetic_scd(bays=2, access_points=2, equipment_types={'CBR': 2, 'DIS': 1},
+                            client_lns=2, unassigned_lnodes=1)
+    model = parser.parse(scdFile)
+    assetTypes = [str(asset.type) for asset in model.assets]
+    assert assetTypes.count('CircuitBreaker') == 4
+    assert assetTypes.count('Equipment') == 2
+    #The PowerTransformer of the substation
+    assert assetTypes.count('Transformer') == 1
+
+    ieds = {str(asset.name): asset for asset in model.assets if asset.type == 'IEDHardware'}
+    clientLNs = [asset for asset in model.assets if '_None_' in str(asset.name)]
+    assert len(clientLNs) == 2 * len(ieds)
+    for lnAsset in clientLNs:
+        assert _associated(model, lnAsset, 'SysExecution')[0] in ieds
+        assert _associated(model, lnAsset, 'ApplicationConnection')[0].endswith('_AP2')
+
+    #The LNodes without an IED are connected to an access point, without a Server
+    unassignedLNs = [asset for asset in model.assets if asset.type == 'LogicalNode'
+                     and _associated(model, asset, 'AppExecution') == ['None_LD0']]
+    assert len(unassignedLNs) == 2
+    for lnAsset in unassignedLNs:
+        assert str(lnAsset.name).startswith('CILO_LD0_1')
+        assert len(_associated(model, lnAsset, 'ApplicationConnection')) == 1
+    assert not any(str(asset.name).startswith('Server_None') for asset in model.assets)
+
+def test_generator_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        generate_scd(str(tmp_path / 'client.scd'), client_lns=1)
+    with pytest.raises(ValueError):
+        generate_scd(str(tmp_path / 'types.scd'), equipment_types={'XYZ': 1})
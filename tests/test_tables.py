@@ -0,0 +1,25 @@
+from maltoolbox.model import Model
+
+from scl_incremental import DUPLICATE_NAME_SUFFIX
+
+#The model of the parser, built with ModelTables, is the one Model.add_asset and add_association build
+def test_tables_match_add_association(parser, synthetic_scd):
+    model = parser.parse(synthetic_scd(bays=3, access_points=2, subnetworks=2))
+    reference = Model(model.name, parser.lang_classes_factory)
+    assets = {}
+    for asset in model.assets:
+        assets[id(asset)] = asset.__class__(name = DUPLICATE_NAME_SUFFIX.sub('', str(asset.name)))
+        reference.add_asset(assets[id(asset)])
+    for association in model.associations:
+        copy = association.__class__()
+        for fieldName in model.get_association_field_names(association):
+            setattr(copy, fieldName, [assets[id(asset)] for asset in getattr(association, fieldName)])
+        reference.add_association(copy)
+    assert any(':' in str(asset.name) for asset in model.assets)
+    #The parser also adds an attacker, which is not part of the tables
+    modelDict, referenceDict = model._to_dict(), reference._to_dict()
+    assert modelDict['assets'] == referenceDict['assets']
+    assert modelDict['associations'] == referenceDict['associations']
+    for asset in model.assets:
+        assert [type(association) for association in asset.associations] == \
+            [type(association) for association in assets[id(asset)].associations]